@@ -15,8 +15,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+BINFEED = True # Read the bars from the binary store of the folder, or else from its CSV files
+
 import datetime
+import os
 import pyalgoext.components as components
+from pyalgotrade.barfeed import yahoofeed
+from pyalgoext import binfeed, optimizer
 
 folder = "./Ibex2010Data/"
 
@@ -62,6 +67,35 @@ instruments = {
 all = {}
 all.update(instruments.copy())
 
+# Bars already loaded by this process, by instrument set. Batch runs load them before
+# starting the workers, which inherit them instead of loading their own copy.
+stores = {}
+
+def load_feed(instruments):
+    """Returns a new feed with the bars of instruments from their start year until endYear (excluded),
+    read from the binary store or from the CSV files of the folder depending on BINFEED.
+    The bars are only read once per process, every other feed is built from that copy."""
+    key = tuple(sorted(instruments.items()))
+    if key not in stores:
+        if BINFEED:
+            store = binfeed.BinaryStore.fromDirectory(folder)
+            feed = binfeed.Feed(store)
+        else:
+            feed = yahoofeed.Feed()
+        feed.sanitizeBars(True)
+        for instrument, startYear in instruments.items():
+            if BINFEED:
+                if store.hasInstrument(instrument):
+                    feed.addBarsFromStore(instrument, datetime.datetime(startYear, 1, 1), datetime.datetime(endYear - 1, 12, 31))
+            else:
+                for year in range(startYear, endYear):
+                    if os.path.isfile(folder + instrument + "-" + str(year) + ".csv"):
+                        feed.addBarsFromCSV(instrument, folder + instrument + "-" + str(year) + ".csv")
+        barStore = optimizer.BarStore.fromFeed(feed)
+        stores[key] = (barStore, barStore.getBars())
+    barStore, bars = stores[key]
+    return barStore.getFeed(bars)
+
 if __name__ == "__main__":
     idxDate = datetime.datetime(2010,01,01,0,0,0)
     symList = components.getList("./IBEX-components.csv", idxDate)
@@ -0,0 +1,86 @@
+# PyAlgoSamples
+# Examples using the PyAlgoTrade Library
+#
+# Copyright 2015-2017 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+# Every configuration is run with the run_strategy of its script, all of them in parallel.
+WORKERS = None # None for one per CPU
+RESULTS = "Ibex2010Batch.csv"
+
+from pyalgoext import studies
+import Ibex2010Assets as assets
+import Ibex2010Rsi
+import Ibex2010RsiShort
+import Ibex2010RsiShortLow
+import Ibex2010Slippage
+import Ibex2010Sma
+import pyalgotrade.logger as logger
+import itertools
+import csv
+
+
+def get_configurations():
+    configurations = []
+
+    # Long RSI, a few thresholds and portfolio sizes
+    for posMax, overSoldThreshold in itertools.product([10, 20, 30], [10, 20, 30]):
+        configurations.append((Ibex2010Rsi.run_strategy, {
+            'isBenchmark': False, 'instruments': assets.instruments, 'posMax': posMax,
+            'entrySma': 250, 'exitSma': 20, 'rsiPeriod': 2, 'overSoldThreshold': overSoldThreshold, 'plot': False}))
+
+    # Long and short RSI, with and without a low threshold
+    for run_strategy, (entrySma, exitSma, rsiPeriod, overSoldThreshold) in [
+        (Ibex2010RsiShort.run_strategy, (250, 20, 2, 30)),
+        (Ibex2010RsiShortLow.run_strategy, (200, 15, 5, 15)),
+    ]:
+        for overBoughtThreshold in [80, 90, 95]:
+            configurations.append((run_strategy, {
+                'isBenchmark': False, 'instruments': assets.instruments, 'posMax': 20,
+                'entrySma': entrySma, 'exitSma': exitSma, 'rsiPeriod': rsiPeriod,
+                'overSoldThreshold': overSoldThreshold, 'overBoughtThreshold': overBoughtThreshold, 'plot': False}))
+
+    # Slippage, in basis points
+    for bps in [0, 5, 10, 20]:
+        configurations.append((Ibex2010Slippage.run_strategy, {
+            'isBenchmark': False, 'instruments': assets.instruments, 'posMax': 20,
+            'entrySma': 200, 'exitSma': 15, 'rsiPeriod': 5, 'overSoldThreshold': 15, 'overBoughtThreshold': 95,
+            'slippagePer': bps / 10000.0, 'plot': False}))
+
+    # SMA crossover
+    for posMax, smaShort, smaLong in itertools.product([10, 32], [20, 50], [100, 200]):
+        configurations.append((Ibex2010Sma.run_strategy, {
+            'isBenchmark': False, 'instruments': assets.instruments, 'posMax': posMax,
+            'smaShort': smaShort, 'smaLong': smaLong, 'plot': False}))
+
+    return configurations
+
+
+if __name__ == '__main__':
+    logger.log_format = "[%(levelname)s] %(message)s"
+
+    # Load the bars once, the workers inherit them
+    assets.load_feed(assets.instruments)
+
+    rows = studies.run_configurations(get_configurations(), WORKERS)
+
+    with open(RESULTS, "wb") as csvFile:
+        fields = [field for field in studies.get_fields(rows) if field not in ['instruments', 'plot']]
+        csvWriter = csv.DictWriter(csvFile, fields, extrasaction='ignore')
+        csvWriter.writeheader()
+        csvWriter.writerows(rows)
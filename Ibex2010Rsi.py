@@ -20,14 +20,10 @@
 """
 
 from pyalgotrade import strategy, plotter
-from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma, rsi, cross
-from pyalgotrade.stratanalyzer import drawdown, returns, sharpe, trades
-from pyalgotrade.utils import stats
+from pyalgoext import performance
 from pyalgoext import volatility
 import pyalgotrade.logger as logger
-import math
-import os
 
 import Ibex2010Assets as assets
 
@@ -130,14 +126,9 @@ class MyStrategy(MyBenchmark):
                    self._positions[instrument].exitMarket()
 
 
-def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod, overSoldThreshold):
-    # Load the yahoo feed from the CSV file
-    feed = yahoofeed.Feed()
-    feed.sanitizeBars(True)
-    for instrument, startYear in instruments.items():
-        for year in range(startYear, assets.endYear):
-            if os.path.isfile(assets.folder + instrument + "-" + str(year) + ".csv"):
-                feed.addBarsFromCSV(instrument, assets.folder + instrument + "-" + str(year) + ".csv")
+def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod, overSoldThreshold, plot=True):
+    # Every feed of the process shares one copy of the bars
+    feed = assets.load_feed(instruments)
 
     if isBenchmark:
         myStrategy = MyBenchmark(feed, instruments, posMax, exitSma)
@@ -145,28 +136,18 @@ def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod,
         myStrategy = MyStrategy(feed, instruments, posMax, entrySma, exitSma, rsiPeriod, overSoldThreshold)
 
     # Attach analyzers to the strategy.
-    # Returns first in case others use it (DataSeries)
-    returnsAnalyzer = returns.Returns()
-    myStrategy.attachAnalyzer(returnsAnalyzer)
-    returnsAnalyzer.getReturns().setMaxLen(1000000)
+    reportAnalyzer = performance.PerformanceReport(0.0036)
+    myStrategy.attachAnalyzer(reportAnalyzer)
 
-    sharpeAnalyzer = sharpe.SharpeRatio()
-    myStrategy.attachAnalyzer(sharpeAnalyzer)
+    if plot:
+        volaAnalyzer = volatility.VolaAnalyzer(120)
+        myStrategy.attachAnalyzer(volaAnalyzer)
 
-    drawDownAnalyzer = drawdown.DrawDown()
-    myStrategy.attachAnalyzer(drawDownAnalyzer)
+        # Attach a plotter to the strategy
+        plt = plotter.StrategyPlotter(myStrategy, False)
 
-    tradesAnalyzer = trades.Trades()
-    myStrategy.attachAnalyzer(tradesAnalyzer)
-
-    volaAnalyzer = volatility.VolaAnalyzer(120)
-    myStrategy.attachAnalyzer(volaAnalyzer)
-
-    # Attach a plotter to the strategy
-    plt = plotter.StrategyPlotter(myStrategy, False)
-
-    volaSeries = volaAnalyzer.getVolaSeries()
-    plt.getOrCreateSubplot("Volatility").addDataSeries("Volatility", volaSeries)
+        volaSeries = volaAnalyzer.getVolaSeries()
+        plt.getOrCreateSubplot("Volatility").addDataSeries("Volatility", volaSeries)
 
     capStart = myStrategy.getBroker().getEquity()
     myStrategy.info("CAPITAL INICIAL: $%.4f" % capStart)
@@ -175,52 +156,25 @@ def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod,
     myStrategy.run()
 
     # Show basic information
-    allRet = returnsAnalyzer.getReturns()
-    capEnd = myStrategy.getBroker().getEquity()
-
-    myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
-    myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (100 * (math.pow((capEnd / capStart),(365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-    myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
-    myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
-
-    myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
-    myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad Media: %.4f%%" % (100 * stats.mean(allRet)))
-    posRet = []
-    negRet = []
-    allRet = returnsAnalyzer.getReturns()
-    for ret in allRet:
-        if ret > 0:
-            posRet.append(ret)
-        elif ret < 0:
-            negRet.append(ret)
-    myStrategy.info("Ganancia Media: %.4f%%" % (100 * stats.mean(posRet)))
-    myStrategy.info("Perdida Media: %.4f%%" % (100 * stats.mean(negRet)))
-    myStrategy.info(" ")
-    myStrategy.info("Ganancia Media por Op: $%s" % (stats.mean(tradesAnalyzer.getProfits())))
-    myStrategy.info("Perdida Media por Op: $%s" % (stats.mean(tradesAnalyzer.getLosses())))
-    myStrategy.info("Comisiones Totales: $%s" % (sum(tradesAnalyzer.getCommissionsForAllTrades())))
-    myStrategy.info("Num Ops Igual: %s" % (tradesAnalyzer.getEvenCount()))
-    myStrategy.info("Num Ops Gano: %s" % (tradesAnalyzer.getProfitableCount()))
-    myStrategy.info("Num Ops Pierdo: %s" % (tradesAnalyzer.getUnprofitableCount()))
-
-
-
-    # Plot the strategy.
-    plt.plot()
-
-logger.log_format = "[%(levelname)s] %(message)s"
-
-entrySma = 250
-exitSma = 20
-rsiPeriod = 2
-overSoldThreshold = 30
-
-# Benchmark
-#run_strategy(True, assets.instruments, 15, entrySma, exitSma, rsiPeriod, overSoldThreshold)
-
-# Strategy
-run_strategy(False, assets.instruments, 20, entrySma, exitSma, rsiPeriod, overSoldThreshold)
\ No newline at end of file
+    reportAnalyzer.logReport(myStrategy)
+
+    if plot:
+        # Plot the strategy.
+        plt.plot()
+
+    return reportAnalyzer.getReport()
+
+
+if __name__ == "__main__":
+    logger.log_format = "[%(levelname)s] %(message)s"
+
+    entrySma = 250
+    exitSma = 20
+    rsiPeriod = 2
+    overSoldThreshold = 30
+
+    # Benchmark
+    #run_strategy(True, assets.instruments, 15, entrySma, exitSma, rsiPeriod, overSoldThreshold)
+
+    # Strategy
+    run_strategy(False, assets.instruments, 20, entrySma, exitSma, rsiPeriod, overSoldThreshold)
@@ -23,11 +23,9 @@ from pyalgotrade import strategy, plotter
 from pyalgotrade.broker import backtesting as broker
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma, rsi, cross
-from pyalgotrade.stratanalyzer import drawdown, returns, sharpe, trades
-from pyalgotrade.utils import stats
+from pyalgoext import performance
 from pyalgoext import volatility
 import pyalgotrade.logger as logger
-import math
 import os
 
 import Ibex2010Assets as assets
@@ -147,19 +145,8 @@ def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod,
         myStrategy = MyStrategy(feed, instruments, posMax, entrySma, exitSma, rsiPeriod, overSoldThreshold)
 
     # Attach analyzers to the strategy.
-    # Returns first in case others use it (DataSeries)
-    returnsAnalyzer = returns.Returns()
-    myStrategy.attachAnalyzer(returnsAnalyzer)
-    returnsAnalyzer.getReturns().setMaxLen(1000000)
-
-    sharpeAnalyzer = sharpe.SharpeRatio()
-    myStrategy.attachAnalyzer(sharpeAnalyzer)
-
-    drawDownAnalyzer = drawdown.DrawDown()
-    myStrategy.attachAnalyzer(drawDownAnalyzer)
-
-    tradesAnalyzer = trades.Trades()
-    myStrategy.attachAnalyzer(tradesAnalyzer)
+    reportAnalyzer = performance.PerformanceReport(0.0036)
+    myStrategy.attachAnalyzer(reportAnalyzer)
 
     volaAnalyzer = volatility.VolaAnalyzer(120)
     myStrategy.attachAnalyzer(volaAnalyzer)
@@ -177,37 +164,7 @@ def run_strategy(isBenchmark, instruments, posMax, entrySma, exitSma, rsiPeriod,
     myStrategy.run()
 
     # Show basic information
-    allRet = returnsAnalyzer.getReturns()
-    capEnd = myStrategy.getBroker().getEquity()
-
-    myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
-    myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (100 * (math.pow((capEnd / capStart),(365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-    myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
-    myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
-
-    myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
-    myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad Media: %.4f%%" % (100 * stats.mean(allRet)))
-    posRet = []
-    negRet = []
-    allRet = returnsAnalyzer.getReturns()
-    for ret in allRet:
-        if ret > 0:
-            posRet.append(ret)
-        elif ret < 0:
-            negRet.append(ret)
-    myStrategy.info("Ganancia Media: %.4f%%" % (100 * stats.mean(posRet)))
-    myStrategy.info("Perdida Media: %.4f%%" % (100 * stats.mean(negRet)))
-    myStrategy.info(" ")
-    myStrategy.info("Ganancia Media por Op: $%s" % (stats.mean(tradesAnalyzer.getProfits())))
-    myStrategy.info("Perdida Media por Op: $%s" % (stats.mean(tradesAnalyzer.getLosses())))
-    myStrategy.info("Comisiones Totales: $%s" % (sum(tradesAnalyzer.getCommissionsForAllTrades())))
-    myStrategy.info("Num Ops Igual: %s" % (tradesAnalyzer.getEvenCount()))
-    myStrategy.info("Num Ops Gano: %s" % (tradesAnalyzer.getProfitableCount()))
-    myStrategy.info("Num Ops Pierdo: %s" % (tradesAnalyzer.getUnprofitableCount()))
+    reportAnalyzer.logReport(myStrategy)
 
     # Plot the strategy.
     plt.plot()
@@ -19,15 +19,17 @@
 .. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
 """
 
+BINFEED = True
+
 from pyalgotrade import strategy, plotter
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma
-from pyalgotrade.stratanalyzer import drawdown, returns, sharpe, trades
-from pyalgotrade.utils import stats
+from pyalgoext import performance
 from pyalgoext import volatility
+from pyalgoext import binfeed
 import IbexAssets as assets
 import pyalgotrade.logger as logger
-import math
+import datetime
 
 class MyBenchmark(strategy.BacktestingStrategy):
     def __init__(self, feed, instruments, posMax, delay):
@@ -123,11 +125,17 @@ class MyStrategy(MyBenchmark):
 
 def run_strategy(isBenchmark, instruments, posMax, smaShort, smaLong):
     # Load the yahoo feed from the CSV file
-    feed = yahoofeed.Feed()
+    if BINFEED:
+        feed = binfeed.Feed(binfeed.BinaryStore.fromDirectory(assets.folder))
+    else:
+        feed = yahoofeed.Feed()
     feed.sanitizeBars(True)
     for instrument, startYear in instruments.items():
-        for year in range(startYear, assets.endYear):
-            feed.addBarsFromCSV(instrument, assets.folder + instrument + "-" + str(year) + ".csv")
+        if BINFEED:
+            feed.addBarsFromStore(instrument, datetime.datetime(startYear, 1, 1), datetime.datetime(assets.endYear - 1, 12, 31))
+        else:
+            for year in range(startYear, assets.endYear):
+                feed.addBarsFromCSV(instrument, assets.folder + instrument + "-" + str(year) + ".csv")
 
     if isBenchmark:
         myStrategy = MyBenchmark(feed, instruments, posMax, smaLong)
@@ -135,19 +143,8 @@ def run_strategy(isBenchmark, instruments, posMax, smaShort, smaLong):
         myStrategy = MyStrategy(feed, instruments, posMax, smaShort, smaLong)
 
     # Attach analyzers to the strategy.
-    # Returns first in case others use it (DataSeries)
-    returnsAnalyzer = returns.Returns()
-    myStrategy.attachAnalyzer(returnsAnalyzer)
-    returnsAnalyzer.getReturns().setMaxLen(1000000)
-
-    sharpeAnalyzer = sharpe.SharpeRatio()
-    myStrategy.attachAnalyzer(sharpeAnalyzer)
-
-    drawDownAnalyzer = drawdown.DrawDown()
-    myStrategy.attachAnalyzer(drawDownAnalyzer)
-
-    tradesAnalyzer = trades.Trades()
-    myStrategy.attachAnalyzer(tradesAnalyzer)
+    reportAnalyzer = performance.PerformanceReport(0.0036)
+    myStrategy.attachAnalyzer(reportAnalyzer)
 
     volaAnalyzer = volatility.VolaAnalyzer(120)
     myStrategy.attachAnalyzer(volaAnalyzer)
@@ -165,37 +162,7 @@ def run_strategy(isBenchmark, instruments, posMax, smaShort, smaLong):
     myStrategy.run()
 
     # Show basic information
-    allRet = returnsAnalyzer.getReturns()
-    capEnd = myStrategy.getBroker().getEquity()
-
-    myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
-    myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (100 * (math.pow((capEnd / capStart),(365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-    myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
-    myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
-
-    myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
-    myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad Media: %.4f%%" % (100 * stats.mean(allRet)))
-    posRet = []
-    negRet = []
-    allRet = returnsAnalyzer.getReturns()
-    for ret in allRet:
-        if ret > 0:
-            posRet.append(ret)
-        elif ret < 0:
-            negRet.append(ret)
-    myStrategy.info("Ganancia Media: %.4f%%" % (100 * stats.mean(posRet)))
-    myStrategy.info("Perdida Media: %.4f%%" % (100 * stats.mean(negRet)))
-    myStrategy.info(" ")
-    myStrategy.info("Ganancia Media por Op: $%s" % (stats.mean(tradesAnalyzer.getProfits())))
-    myStrategy.info("Perdida Media por Op: $%s" % (stats.mean(tradesAnalyzer.getLosses())))
-    myStrategy.info("Comisiones Totales: $%s" % (sum(tradesAnalyzer.getCommissionsForAllTrades())))
-    myStrategy.info("Num Ops Igual: %s" % (tradesAnalyzer.getEvenCount()))
-    myStrategy.info("Num Ops Gano: %s" % (tradesAnalyzer.getProfitableCount()))
-    myStrategy.info("Num Ops Pierdo: %s" % (tradesAnalyzer.getUnprofitableCount()))
+    reportAnalyzer.logReport(myStrategy)
 
     # Plot the strategy.
     plt.plot()
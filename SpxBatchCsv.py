@@ -19,9 +19,17 @@
 .. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
 """
 
+BINFEED = True
+# Windows of WINDOW years from START_YEAR until END_YEAR, each one run with every (smaShort, smaLong).
+START_YEAR = 1950
+END_YEAR = 2016
+WINDOW = 10
+SMAS = [(50, 200)]
+
 from pyalgotrade import strategy, plotter
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma
+from pyalgoext import binfeed, studies
 import csv
 
 class MyStrategy(strategy.BacktestingStrategy):
@@ -74,35 +82,29 @@ class MyBenchmark(MyStrategy):
             amount = int(0.95 * self.getBroker().getEquity() / bar.getAdjClose())
             self._position = self.enterLong(self._instrument, amount, True)
 
-def run_strategy(index, startYear, endYear, smaShort, smaLong):
+def load_feed(index, startYear, endYear):
 
-    # Load the yahoo feed from the CSV file
-    feed = yahoofeed.Feed()
+    # Load the whole history once, every window runs on a slice of it
+    if BINFEED:
+        feed = binfeed.Feed(binfeed.BinaryStore.fromDirectory("./data/"))
+    else:
+        feed = yahoofeed.Feed()
     feed.sanitizeBars(True)
-    for year in range(startYear, endYear):
-        feed.addBarsFromCSV(index, "./data/" + index + "-" + str(year) + ".csv")
-
-    myStrategy = MyStrategy(feed, index, smaShort, smaLong)
-    myStrategy.run()
-
-    # Important! Otherwise the Benchmark won't run (nor fail)
-    feed.reset()
-
-    myBenchmark = MyBenchmark(feed, index, smaShort, smaLong)
-    myBenchmark.run()
-
-    retStrategy = myStrategy.getBroker().getEquity()
-    retBenchmark = myBenchmark.getBroker().getEquity()
-
-    return [str(startYear) + "-" + str(endYear), retStrategy, retBenchmark, (retStrategy - retBenchmark)]
-
-
-index = "^GSPC"
-with open("SxpStudy.csv", "wb") as csvFile:
-    csvWriter = csv.writer(csvFile)
-    csvWriter.writerow(["Year", "Strategy", "Benchmark", "Delta"])
-    for startYear in range (1950, 2016, 10):
-        endYear = startYear + 10
-        if endYear > 2016:
-            endYear = 2016
-        csvWriter.writerow(run_strategy(index, startYear, endYear, 50, 200))
\ No newline at end of file
+    if BINFEED:
+        feed.addBarsFromStore(index)
+    else:
+        for year in range(startYear, endYear):
+            feed.addBarsFromCSV(index, "./data/" + index + "-" + str(year) + ".csv")
+    return feed
+
+
+if __name__ == '__main__':
+    index = "^GSPC"
+    windows = studies.year_windows(START_YEAR, END_YEAR, WINDOW)
+    parameters = [(index, smaShort, smaLong) for smaShort, smaLong in SMAS]
+    rows = studies.run(MyStrategy, load_feed(index, START_YEAR, END_YEAR), windows, parameters, MyBenchmark)
+
+    with open("SxpStudy.csv", "wb") as csvFile:
+        csvWriter = csv.writer(csvFile)
+        csvWriter.writerow(["Year", "Index", "SmaShort", "SmaLong", "Strategy", "Benchmark", "Delta"])
+        csvWriter.writerows(rows)
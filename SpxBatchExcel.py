@@ -19,9 +19,16 @@
 .. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
 """
 
+# Windows of WINDOW years from START_YEAR until END_YEAR, each one run with every (smaShort, smaLong).
+START_YEAR = 1950
+END_YEAR = 2016
+WINDOW = 10
+SMAS = [(50, 200)]
+
 from pyalgotrade import strategy
 from pyalgotrade.barfeed import yahoofeed
 from pyalgotrade.technical import ma
+from pyalgoext import studies
 import xlsxwriter
 from xlsxwriter import utility as xlsxutil
 
@@ -75,60 +82,48 @@ class MyBenchmark(MyStrategy):
             amount = int(0.95 * self.getBroker().getEquity() / bar.getAdjClose())
             self._position = self.enterLong(self._instrument, amount, True)
 
-def run_strategy(index, startYear, endYear, smaShort, smaLong):
+def load_feed(index, startYear, endYear):
 
-    # Load the yahoo feed from the CSV file
+    # Load the whole history once, every window runs on a slice of it
     feed = yahoofeed.Feed()
     feed.sanitizeBars(True)
     for year in range(startYear, endYear):
         feed.addBarsFromCSV(index, "./data/" + index + "-" + str(year) + ".csv")
-
-    myStrategy = MyStrategy(feed, index, smaShort, smaLong)
-    myStrategy.run()
-
-    # Important! Otherwise the Benchmark won't run (nor fail)
-    feed.reset()
-
-    myBenchmark = MyBenchmark(feed, index, smaShort, smaLong)
-    myBenchmark.run()
-
-    retStrategy = myStrategy.getBroker().getEquity()
-    retBenchmark = myBenchmark.getBroker().getEquity()
-
-    return [str(startYear) + "-" + str(endYear), retStrategy, retBenchmark, (retStrategy - retBenchmark)]
-
-
-index = "^GSPC"
-with xlsxwriter.Workbook("SpxStudy.xlsx") as workbook:
-    worksheet = workbook.add_worksheet()
-
-    titleFormat = workbook.add_format({'bold': True, 'bg_color': "#b3ddeb"})
-    numFormat = workbook.add_format({'num_format': '$#,##0.00_);[Red]($#,##0.00)'})
-
-    # Write the data header
-    row = 0
-    worksheet.write(row, 0, "Year", titleFormat)
-    worksheet.write(row, 1, "Strategy", titleFormat)
-    worksheet.write(row, 2, "Benchmark", titleFormat)
-    worksheet.write(row, 3, "Delta", titleFormat)
-
-    # Write each row of data
-    for startYear in range(1950, 2016, 10):
-        row += 1
-        endYear = startYear + 10
-        if endYear > 2016:
-            endYear = 2016
-        data = run_strategy(index, startYear, endYear, 50, 200)
-        worksheet.write(row, 0, data[0])
-        worksheet.write(row, 1, data[1])
-        worksheet.write(row, 2, data[2])
-        worksheet.write(row, 3, "=B" + str(row + 1) + "-C" + str(row + 1), numFormat)
-
-    # Create a new chart object.
-    chart = workbook.add_chart({'type': 'line'})
-    chart.add_series({'name': 'Strategy', 'categories': '=Sheet1!$A$2:$A$' + str(row + 1), 'values': '=Sheet1!$B$2:$B$' + str(row + 1)})
-    chart.add_series({'name': 'Benchmark', 'categories': '=Sheet1!$A$2:$A$' + str(row + 1), 'values': '=Sheet1!$C$2:$C$' + str(row + 1)})
-    worksheet.insert_chart("A" + str(row + 3), chart)
-
-    # Use this to convert col numbers to letters (0-indexed)
-    # print xlsxutil.xl_col_to_name(0)
\ No newline at end of file
+    return feed
+
+
+if __name__ == '__main__':
+    index = "^GSPC"
+    windows = studies.year_windows(START_YEAR, END_YEAR, WINDOW)
+    parameters = [(index, smaShort, smaLong) for smaShort, smaLong in SMAS]
+    rows = studies.run(MyStrategy, load_feed(index, START_YEAR, END_YEAR), windows, parameters, MyBenchmark)
+
+    with xlsxwriter.Workbook("SpxStudy.xlsx") as workbook:
+        worksheet = workbook.add_worksheet()
+
+        titleFormat = workbook.add_format({'bold': True, 'bg_color': "#b3ddeb"})
+        numFormat = workbook.add_format({'num_format': '$#,##0.00_);[Red]($#,##0.00)'})
+
+        # Write the data header
+        row = 0
+        for col, title in enumerate(["Year", "SmaShort", "SmaLong", "Strategy", "Benchmark", "Delta"]):
+            worksheet.write(row, col, title, titleFormat)
+
+        # Write each row of data
+        for label, instrument, smaShort, smaLong, retStrategy, retBenchmark, delta in rows:
+            row += 1
+            worksheet.write(row, 0, label)
+            worksheet.write(row, 1, smaShort)
+            worksheet.write(row, 2, smaLong)
+            worksheet.write(row, 3, retStrategy)
+            worksheet.write(row, 4, retBenchmark)
+            worksheet.write(row, 5, "=D" + str(row + 1) + "-E" + str(row + 1), numFormat)
+
+        # Create a new chart object.
+        chart = workbook.add_chart({'type': 'line'})
+        chart.add_series({'name': 'Strategy', 'categories': '=Sheet1!$A$2:$A$' + str(row + 1), 'values': '=Sheet1!$D$2:$D$' + str(row + 1)})
+        chart.add_series({'name': 'Benchmark', 'categories': '=Sheet1!$A$2:$A$' + str(row + 1), 'values': '=Sheet1!$E$2:$E$' + str(row + 1)})
+        worksheet.insert_chart("A" + str(row + 3), chart)
+
+        # Use this to convert col numbers to letters (0-indexed)
+        # print xlsxutil.xl_col_to_name(0)
@@ -21,7 +21,12 @@
 
 from pyalgoext import download
 
-download.quandl_bitcoin("BCHARTS/KRAKENUSD", "data/BTCUSD-KRAKEN.csv")
-download.quandl_bitcoin("BCHARTS/COINBASEUSD", "data/BTCUSD-COINBASE.csv")
-download.quandl_bitcoin("BCHARTS/BITSTAMPUSD", "data/BTCUSD-BITSTAMP.csv")
-download.quandl_bitcoin("BCHARTS/ITBITUSD", "data/BTCUSD-ITBIT.csv")
\ No newline at end of file
+source = download.QuandlSource()
+results = download.run([
+    download.Download(source, "BCHARTS/KRAKENUSD", "data/BTCUSD-KRAKEN.csv"),
+    download.Download(source, "BCHARTS/COINBASEUSD", "data/BTCUSD-COINBASE.csv"),
+    download.Download(source, "BCHARTS/BITSTAMPUSD", "data/BTCUSD-BITSTAMP.csv"),
+    download.Download(source, "BCHARTS/ITBITUSD", "data/BTCUSD-ITBIT.csv"),
+])
+for store, result in sorted(results.items()):
+    print("%s %s" % (store, result))
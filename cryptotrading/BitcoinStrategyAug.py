@@ -24,7 +24,7 @@ SCENARIO = 3
 FIXED = False
 TRAILING = False
 
-from pyalgotrade import strategy, plotter, dataseries
+from pyalgotrade import strategy, plotter
 from pyalgotrade.technical import ma, macd, cross
 from pyalgotrade.stratanalyzer import drawdown, returns, sharpe
 from pyalgotrade.utils import stats
@@ -32,31 +32,10 @@ import math
 from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
 from pyalgotrade.barfeed import yahoofeed
-from pyalgotrade.talibext import indicator
+from pyalgoext import aroon
+from pyalgoext import stops
 from pyalgoext import iplots
 
-class TrailingStopOrder(backtesting.StopOrder):
-    def __init__(self, action, position, pricePer, quantity, instrumentTraits):
-        backtesting.StopOrder.__init__(self, action, position.getInstrument(), 0, quantity, instrumentTraits)
-        if action == broker.Order.Action.SELL:
-            pricePer = 1 - pricePer
-        else:
-            pricePer = 1 + pricePer
-        self._pricePer = pricePer
-        self._position = position
-        self._refPrice = 0
-
-    def getStopPrice(self):
-        lastPrice = self._position.getLastPrice()
-        if self.getAction() == broker.Order.Action.SELL:
-            if self._refPrice < lastPrice:
-                self._refPrice = lastPrice
-        else:
-            if self._refPrice > lastPrice:
-                self._refPrice = lastPrice
-        return self._refPrice * self._pricePer
-
-
 class MyBenchmark(strategy.BacktestingStrategy):
     def __init__(self, feed, stopPer, stopTrailing, stopFixed, delay):
         myBroker = backtesting.Broker(1000000, feed, backtesting.TradePercentage(0.002))
@@ -78,6 +57,7 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
         self._stopPer = stopPer
         self._stopTrailing = stopTrailing
+        self._trailingStops = stops.TrailingStopBook(self)
         self._stopFixed = stopFixed
 
         self.setUseAdjustedValues(True)
@@ -87,19 +67,13 @@ class MyBenchmark(strategy.BacktestingStrategy):
         if order.getAction() == broker.Order.Action.BUY:
             self.logOp("COMPRA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.SELL, position, self._stopPer, position.getShares(), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             elif self._stopFixed:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 - self._stopPer), True)
         else:
             self.logOp("VENTA CORTA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.BUY_TO_COVER, position, self._stopPer, math.fabs(position.getShares()), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             else:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 + self._stopPer), True)
 
@@ -216,7 +190,7 @@ class MyTaLibStrategy(MyBasicStrategy):
         self._aroon = {}
         self._aroonPeriod = aroonPeriod
         for instrument in feed.getRegisteredInstruments():
-            self._aroon[instrument] = dataseries.SequenceDataSeries()
+            self._aroon[instrument] = aroon.AroonOscillator(self.getFeed()[instrument], aroonPeriod)
 
     def onBars(self, bars):
         for instrument, bar in bars.items():
@@ -224,16 +198,16 @@ class MyTaLibStrategy(MyBasicStrategy):
             if not self._smaLong[instrument] or self._smaLong[instrument][-1] is None:
                 return
 
-            barDs = self.getFeed().getDataSeries(instrument)
-            aroon = indicator.AROONOSC(barDs, self._aroonPeriod + 1, self._aroonPeriod)
-            self._aroon[instrument].appendWithDateTime(self.getCurrentDateTime(), aroon[-1])
+            aroonValue = self._aroon[instrument][-1]
+            if aroonValue is None:
+                continue
 
             if instrument in self._posLong:
-                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] < -50:
+                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue < -50:
                     position = self._posLong[instrument]
                     self.prepareExit(position)
 
-            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] > 50:
+            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue > 50:
                 self.prepareEnter(instrument, bars)
 
 
@@ -308,8 +282,5 @@ if __name__ == "__main__":
     #plt.plot()
 
     filename = "../store/bitcoinstrategy-augmented.html"
-    iplots.plot(plt.buildFigure(), filename=filename, auto_open=False)
-
-    # This line makes all the difference!
-    iplots.augment(filename)
+    iplots.plot_strategy(plt, filename=filename)
 
@@ -23,5 +23,10 @@
 from pyalgoext import download
 from datetime import datetime
 
-download.poloniex_crypto("BTC_ETH", "data/BTC_ETH.csv")
-download.poloniex_crypto("BTC_LTC", "data/BTC_LTC.csv", datetime.strptime('2016-06-01', '%Y-%m-%d'))
\ No newline at end of file
+source = download.PoloniexSource()
+results = download.run([
+    download.Download(source, "BTC_ETH", "data/BTC_ETH.csv", datetime.strptime('2015-01-01', '%Y-%m-%d')),
+    download.Download(source, "BTC_LTC", "data/BTC_LTC.csv", datetime.strptime('2016-06-01', '%Y-%m-%d')),
+])
+for store, result in sorted(results.items()):
+    print("%s %s" % (store, result))
@@ -24,12 +24,9 @@ SCENARIO = 0
 
 from pyalgotrade import strategy, plotter
 from pyalgotrade.broker import backtesting as broker
-from pyalgotrade.stratanalyzer import returns, sharpe, drawdown, trades
-from pyalgotrade.utils import stats
 from pyalgotrade.technical import macd, cross, ma
-from pyalgoext import dbfeed, organizers, volatility
+from pyalgoext import dbfeed, organizers, performance, volatility
 import datetime
-import math
 
 
 class MyBenchmark(strategy.BacktestingStrategy):
@@ -253,8 +250,9 @@ indices = [
 capStart = 1000000
 startDate = None # e.g. datetime.date(2015, 06, 01)
 endDate = None
+prefetch = 250 # Sessions loaded per query, None to query session by session
 
-feed = dbfeed.DbFeed(config, fields, 10, startDate, endDate)
+feed = dbfeed.DbFeed(config, fields, 10, startDate, endDate, prefetch)
 for index in indices:
     feed.registerIndex(index)
 
@@ -300,18 +298,8 @@ else:
 
 # Attach analyzers to the strategy
 
-returnsAnalyzer = returns.Returns()
-myStrategy.attachAnalyzer(returnsAnalyzer)
-returnsAnalyzer.getReturns().setMaxLen(1000000)
-
-sharpeAnalyzer = sharpe.SharpeRatio()
-myStrategy.attachAnalyzer(sharpeAnalyzer)
-
-drawDownAnalyzer = drawdown.DrawDown()
-myStrategy.attachAnalyzer(drawDownAnalyzer)
-
-tradesAnalyzer = trades.Trades()
-myStrategy.attachAnalyzer(tradesAnalyzer)
+reportAnalyzer = performance.PerformanceReport(0.0036)
+myStrategy.attachAnalyzer(reportAnalyzer)
 
 volaAnalyzer = volatility.VolaAnalyzer(120)
 myStrategy.attachAnalyzer(volaAnalyzer)
@@ -326,38 +314,7 @@ myStrategy.info("CAPITAL INICIAL: $%.4f" % capStart)
 myStrategy.run()
 
 # Show basic information
-allRet = returnsAnalyzer.getReturns()
-capEnd = myStrategy.getBroker().getEquity()
-
-myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
-myStrategy.info(" ")
-myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
-myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (
-    100 * (math.pow((capEnd / capStart), (365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
-myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
-
-myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
-myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
-myStrategy.info(" ")
-myStrategy.info("Rentabilidad Media: %.4f%%" % (100 * stats.mean(allRet)))
-posRet = []
-negRet = []
-allRet = returnsAnalyzer.getReturns()
-for ret in allRet:
-    if ret > 0:
-        posRet.append(ret)
-    elif ret < 0:
-        negRet.append(ret)
-myStrategy.info("Ganancia Media: %.4f%%" % (100 * stats.mean(posRet)))
-myStrategy.info("Perdida Media: %.4f%%" % (100 * stats.mean(negRet)))
-myStrategy.info(" ")
-myStrategy.info("Ganancia Media por Op: $%s" % (stats.mean(tradesAnalyzer.getProfits())))
-myStrategy.info("Perdida Media por Op: $%s" % (stats.mean(tradesAnalyzer.getLosses())))
-myStrategy.info("Comisiones Totales: $%s" % (sum(tradesAnalyzer.getCommissionsForAllTrades())))
-myStrategy.info("Num Ops Igual: %s" % (tradesAnalyzer.getEvenCount()))
-myStrategy.info("Num Ops Gano: %s" % (tradesAnalyzer.getProfitableCount()))
-myStrategy.info("Num Ops Pierdo: %s" % (tradesAnalyzer.getUnprofitableCount()))
+reportAnalyzer.logReport(myStrategy)
 
 plt.plot()
 
@@ -19,300 +19,199 @@
 .. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
 """
 
-import csv
 from openpyxl import load_workbook
 import warnings
 import datetime
+import time
+import multiprocessing
 import mysql.connector
 import decimal
+import numpy as np
+from pyalgoext import membership
 
 warnings.simplefilter('ignore')
 
+# Rows sent to the database per executemany call
+BATCH_SIZE = 5000
+# Processes parsing sheets in parallel, None for one per CPU and 1 for no parallelism
+WORKERS = 1
+
+CONCEPTS = ['PBV', 'PER', 'DPS', 'NDE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL', 'ADJ']
+SKIP_SHEETS = ['__FDSCACHE__', 'Companies']
+
 def getList(idxCsv, index, cnx):
+    timeline = membership.MembershipTimeline.fromCsv(idxCsv, index)
     cursor = cnx.cursor()
-    with open(idxCsv, "rU") as fileIn:
-        csvIn = csv.reader(fileIn)
-        csvIn.next()
-        idxList = []
-        lastEvtDateTime = None
-        for row in csvIn:
-            evtDateTime = datetime.datetime.strptime(row[0],"%Y-%m-%d")
-            if lastEvtDateTime != evtDateTime:
-                if lastEvtDateTime:
-                    recordList(lastEvtDateTime, index, idxList, cursor)
-                lastEvtDateTime = evtDateTime
-            for symbol in row[1].split():
-                if symbol in idxList:
-                    print("%s - symbol %s already in index" % (evtDateTime, symbol))
-                else:
-                    idxList.append(symbol)
-            for symbol in row[2].split():
-                if symbol in idxList:
-                    idxList.remove(symbol)
-                else:
-                    print("%s - symbol %s not in index" % (evtDateTime, symbol))
-        if lastEvtDateTime:
-            recordList(lastEvtDateTime, index, idxList, cursor)
+    for evtDateTime in timeline.getChangeDates(index):
+        recordList(evtDateTime, index, timeline.getMembers(index, evtDateTime), cursor)
     cnx.commit()
     cursor.close()
-    return idxList
+    return list(timeline.getMembers(index, datetime.datetime.now()))
 
 def recordList(dateTime, index, instruments, cursor):
     sql = "INSERT IGNORE INTO grupo (fecha, indice, activo) VALUES (%s, %s, %s)"
-    for instrument in instruments:
-        params = [dateTime, index, instrument]
-        cursor.execute(sql, params)
+    cursor.executemany(sql, [(dateTime, index, instrument) for instrument in instruments])
 
-def recordData(fileName, cnx):
+def readSheet(job):
+    # Parses one sheet into dato rows. Runs in the worker processes, so it opens its own workbook.
+    fileName, sheet = job
     wb = load_workbook(filename=fileName, read_only=True)
-    sheets = wb.get_sheet_names()
-
-    cursor = cnx.cursor()
-    sql = "INSERT IGNORE INTO dato (activo, criterio, fecha, valor) VALUES (%s, %s, %s, %s)"
-
-    for sheet in sheets:
-        if sheet in ['__FDSCACHE__', 'Companies']:
-            continue
-
-        ws = wb.get_sheet_by_name(sheet)
-        for y, row in enumerate(ws.rows):
-            if y > 1:
-                for x, concept in enumerate(['PBV', 'PER', 'DPS', 'NDE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL', 'ADJ']):
-                    dateTime = row[x * 2].value
-                    value = row[(x * 2) + 1].value
-                    if dateTime != None and not isinstance(value, str):
-                        if isinstance(value, float):
-                            value = round(value, 10)
-                        params = [sheet, concept, dateTime, value]
-                        cursor.execute(sql, params)
-                    elif concept != 'NDE':
-                        print "%s %s %s %s %s" % (sheet, dateTime, concept, value, type(value))
-
+    ws = wb.get_sheet_by_name(sheet)
+    rows = []
+    skipped = []
+    for y, row in enumerate(ws.rows):
+        if y > 1:
+            for x, concept in enumerate(CONCEPTS):
+                dateTime = row[x * 2].value
+                value = row[(x * 2) + 1].value
+                if dateTime != None and not isinstance(value, str):
+                    if isinstance(value, float):
+                        value = round(value, 10)
+                    rows.append((sheet, concept, dateTime, value))
+                elif concept != 'NDE':
+                    skipped.append("%s %s %s %s %s" % (sheet, dateTime, concept, value, type(value)))
+    return sheet, rows, skipped
+
+def writeRows(cnx, cursor, sql, rows, batchSize):
+    for start in range(0, len(rows), batchSize):
+        cursor.executemany(sql, rows[start:start + batchSize])
         cnx.commit()
 
-    cursor.close()
-
+def recordData(fileName, cnx, batchSize=BATCH_SIZE, workers=WORKERS):
+    wb = load_workbook(filename=fileName, read_only=True)
+    jobs = [(fileName, sheet) for sheet in wb.get_sheet_names() if sheet not in SKIP_SHEETS]
 
-def validateData(cnx, cnx2):
     cursor = cnx.cursor()
-    sql = "SELECT DISTINCT(activo) FROM dato"
-    cursor.execute(sql)
-    instruments = []
-    for row in cursor:
-        instruments.append(row[0])
-
-
-    prob = 0
-
-    for instrument in instruments:
-        sql = "SELECT fecha, criterio, valor FROM dato WHERE activo = %s ORDER BY fecha ASC"
-        lastDateTime = None
-        dateTime = None
-        cursor.execute(sql, [instrument])
-        Open = None
-        High = None
-        Low = None
-        Close = None
-        for row in cursor:
-            dateTime = row[0]
-
-            if lastDateTime == None:
-                lastDateTime = dateTime
-            if lastDateTime != dateTime:
-
-                fixer = cnx2.cursor()
-
-                isDie = False
-                if not Close:
-                    print "MISSING CLOSE"
-                    print "%s %s %s %s %s %s" % (instrument, lastDateTime, Open, High, Low, Close)
-
-                    if Open:
-                        Close = Open
-                    elif High:
-                        Close = High
-                    elif Low:
-                        Close = Low
-                    else:
-                        print "DELETED"
-                        fixer.execute("DELETE FROM dato WHERE activo = %s AND fecha = %s",
-                                      [instrument, lastDateTime])
-                        cnx2.commit()
-                        isDie = True
-
-                if not isDie:
-                    if not High:
-                        prob += 1
-                        High = Close
-                        print "%s MISSING HIGH" % prob
-                        fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                                     [Close, instrument, 'HIGH', lastDateTime])
-                        cnx2.commit()
-                    if not Low:
-                        prob += 1
-                        Low = Close
-                        print "%s MISSING LOW" % prob
-                        fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                                     [Close, instrument, 'LOW', lastDateTime])
-                        cnx2.commit()
-                    if not Open:
-                        prob += 1
-                        Open = Close
-                        print "%s MISSING OPEN" % prob
-                        fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                                      [Close, instrument, 'OPEN', lastDateTime])
-                        cnx2.commit()
-
-                    if High < Low:
-                        print "high < low on"
-                        isDie = True
-                    elif High < Open:
-                        prob += 1
-                        print "%s high < open" % prob
-                        fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                                     [Open, instrument, 'HIGH', lastDateTime])
-                        cnx2.commit()
-                    elif High < Close:
-                        prob += 1
-                        print "%s high < close" % prob
-                        fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                                      [Close, instrument, 'HIGH', lastDateTime])
-                        cnx2.commit()
-                    elif Low > Open:
-                        prob += 1
-                        print "%s low > open" % prob
-                        fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                                      [Open, instrument, 'LOW', lastDateTime])
-                        cnx2.commit()
-                    elif Low > Close:
-                        prob += 1
-                        print "%s low > close" % prob
-                        fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                                      [Close, instrument, 'LOW', lastDateTime])
-                        cnx2.commit()
-                else:
-                    pass
-                    #print "%s %s %s %s %s %s" % (instrument, lastDateTime, Open, High, Low, Close)
-                    #exit(0)
-
-                lastDateTime = dateTime
-                Open = None
-                High = None
-                Low = None
-                Close = None
-
-            if row[1] == 'OPEN':
-                Open = row[2]
-            elif row[1] == 'HIGH':
-                High = row[2]
-            elif row[1] == 'LOW':
-                Low = row[2]
-            elif row[1] == 'CLOSE':
-                Close = row[2]
-
-        if lastDateTime != dateTime:
-
-            fixer = cnx2.cursor()
-
-            isDie = False
-            if not Close:
-                print "MISSING CLOSE"
-                print "%s %s %s %s %s %s" % (instrument, lastDateTime, Open, High, Low, Close)
-                exit(0)
-
-                if Open:
-                    Close = Open
-                elif High:
-                    Close = High
-                elif Low:
-                    Close = Low
-                else:
-                    exit(0)
-
-                fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                              [Close, instrument, 'HIGH', lastDateTime])
-                cnx2.commit()
-
-            if not High:
-                prob += 1
-                High = Close
-                print "%s MISSING HIGH" % prob
-                fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                              [Close, instrument, 'HIGH', lastDateTime])
-                cnx2.commit()
-            if not Low:
-                prob += 1
-                Low = Close
-                print "%s MISSING LOW" % prob
-                fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                              [Close, instrument, 'LOW', lastDateTime])
-                cnx2.commit()
-            if not Open:
-                prob += 1
-                Open = Close
-                print "%s MISSING OPEN" % prob
-                fixer.execute("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)",
-                              [Close, instrument, 'OPEN', lastDateTime])
-                cnx2.commit()
-
-            if High < Low:
-                print "high < low on"
-                isDie = True
-            elif High < Open:
-                prob += 1
-                print "%s high < open" % prob
-                fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                              [Open, instrument, 'HIGH', lastDateTime])
-                cnx2.commit()
-            elif High < Close:
-                prob += 1
-                print "%s high < close" % prob
-                fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                              [Close, instrument, 'HIGH', lastDateTime])
-                cnx2.commit()
-            elif Low > Open:
-                prob += 1
-                print "%s low > open" % prob
-                fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                              [Open, instrument, 'LOW', lastDateTime])
-                cnx2.commit()
-            elif Low > Close:
-                prob += 1
-                print "%s low > close" % prob
-                fixer.execute("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
-                              [Close, instrument, 'LOW', lastDateTime])
-                cnx2.commit()
-
-            if isDie:
-                print "%s %s %s %s %s %s" % (instrument, lastDateTime, Open, High, Low, Close)
-                exit(0)
+    sql = "INSERT IGNORE INTO dato (activo, criterio, fecha, valor) VALUES (%s, %s, %s, %s)"
 
-            lastDateTime = dateTime
-            Open = None
-            High = None
-            Low = None
-            Close = None
+    pool = None
+    if workers == 1:
+        sheets = (readSheet(job) for job in jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        sheets = pool.imap_unordered(readSheet, jobs)
+
+    start = time.time()
+    total = 0
+    buffer = []
+    try:
+        for done, (sheet, rows, skipped) in enumerate(sheets):
+            for message in skipped:
+                print message
+            buffer.extend(rows)
+            if len(buffer) >= batchSize:
+                writeRows(cnx, cursor, sql, buffer, batchSize)
+                total += len(buffer)
+                buffer = []
+            elapsed = max(time.time() - start, 0.001)
+            print "%s done (%d/%d sheets), %d rows at %d rows/s" % (sheet, done + 1, len(jobs), total + len(buffer), (total + len(buffer)) / elapsed)
+        writeRows(cnx, cursor, sql, buffer, batchSize)
+        total += len(buffer)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     cursor.close()
+    elapsed = max(time.time() - start, 0.001)
+    print "%d rows recorded in %.1f seconds (%d rows/s)" % (total, elapsed, total / elapsed)
 
 
+PRICES = ['OPEN', 'HIGH', 'LOW', 'CLOSE']
 
-config = {
-    'user': 'root',
-    'password': '',
-    'host': 'localhost',
-    'database': 'ibex35',
-    'raise_on_warnings': True
-}
-cnx = mysql.connector.connect(**config)
-cnx.isolation_level = None  			# To do auto-commit
+def loadPrices(cursor):
+    # Pivots the dato table into one (open, high, low, close) row per instrument and session,
+    # NaN when missing or zero. Sessions with only fundamentals get a row of NaNs.
+    cursor.execute("SELECT activo, fecha FROM dato GROUP BY activo, fecha ORDER BY activo, fecha")
+    keys = [(instrument, dateTime) for instrument, dateTime in cursor]
+    positions = dict((key, pos) for pos, key in enumerate(keys))
 
-cnx2 = mysql.connector.connect(**config)
-cnx2.isolation_level = None
+    prices = np.full((len(keys), len(PRICES)), np.nan)
+    sql = "SELECT activo, fecha, criterio, valor FROM dato WHERE criterio IN (%s)" % ','.join(["%s"] * len(PRICES))
+    cursor.execute(sql, PRICES)
+    for instrument, dateTime, criteria, value in cursor:
+        if value:
+            prices[positions[(instrument, dateTime)], PRICES.index(criteria)] = float(value)
+    return keys, prices
 
-#getList('IBEX-components.csv', 'IBEX35', cnx)
-#recordData('IBEX_DATA.xlsx', cnx)
-validateData(cnx, cnx2)
+def validateData(cnx, batchSize=BATCH_SIZE, dryRun=False):
+    startTime = time.time()
+    cursor = cnx.cursor()
+    keys, prices = loadPrices(cursor)
+    Open, High, Low, Close = [prices[:, pos].copy() for pos in range(len(PRICES))]
+
+    # A missing close is taken from the open, high or low, in that order.
+    missing = dict((criteria, np.isnan(prices[:, pos])) for pos, criteria in enumerate(PRICES))
+    Close = np.where(np.isnan(Close), Open, Close)
+    Close = np.where(np.isnan(Close), High, Close)
+    Close = np.where(np.isnan(Close), Low, Close)
+    dead = np.isnan(Close)
+
+    # The rest of the missing prices are taken from the close.
+    Open = np.where(np.isnan(Open), Close, Open)
+    High = np.where(np.isnan(High), Close, High)
+    Low = np.where(np.isnan(Low), Close, Low)
+
+    with np.errstate(invalid='ignore'):
+        broken = ~dead & (High < Low)
+        fixHigh = ~dead & ~broken & (High < np.maximum(Open, Close))
+        fixLow = ~dead & ~broken & (Low > np.minimum(Open, Close))
+    High = np.where(fixHigh, np.maximum(Open, Close), High)
+    Low = np.where(fixLow, np.minimum(Open, Close), Low)
+
+    deletes = [keys[pos] for pos in np.nonzero(dead)[0]]
+    inserts = []
+    for criteria, values in zip(PRICES, [Open, High, Low, Close]):
+        for pos in np.nonzero(missing[criteria] & ~dead)[0]:
+            inserts.append((float(values[pos]), keys[pos][0], criteria, keys[pos][1]))
+    updates = []
+    for criteria, values, fix in [('HIGH', High, fixHigh), ('LOW', Low, fixLow)]:
+        for pos in np.nonzero(fix & ~missing[criteria])[0]:
+            updates.append((float(values[pos]), keys[pos][0], criteria, keys[pos][1]))
+
+    if not dryRun:
+        try:
+            for batch in range(0, len(deletes), batchSize):
+                cursor.executemany("DELETE FROM dato WHERE activo = %s AND fecha = %s", deletes[batch:batch + batchSize])
+            for batch in range(0, len(inserts), batchSize):
+                cursor.executemany("INSERT INTO dato (valor, activo, criterio, fecha) VALUES (%s, %s, %s, %s)"
+                                   " ON DUPLICATE KEY UPDATE valor = VALUES(valor)", inserts[batch:batch + batchSize])
+            for batch in range(0, len(updates), batchSize):
+                cursor.executemany("UPDATE dato SET valor = %s WHERE activo = %s AND criterio = %s AND fecha = %s",
+                                   updates[batch:batch + batchSize])
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+    cursor.close()
 
-cnx2.close()
-cnx.close()
\ No newline at end of file
+    print "%d sessions of %d instruments checked in %.1f seconds" % (len(keys), len(set(key[0] for key in keys)), time.time() - startTime)
+    print "%d sessions without prices deleted" % len(deletes)
+    for criteria in PRICES:
+        print "%d missing %s filled" % (np.count_nonzero(missing[criteria] & ~dead), criteria)
+    print "%d high below open or close raised" % np.count_nonzero(fixHigh)
+    print "%d low above open or close lowered" % np.count_nonzero(fixLow)
+    print "%d sessions with high < low left for review:" % np.count_nonzero(broken)
+    for pos in np.nonzero(broken)[0]:
+        print "%s %s %s %s %s %s" % (keys[pos][0], keys[pos][1], Open[pos], High[pos], Low[pos], Close[pos])
+    if dryRun:
+        print "Dry run, no changes were applied"
+
+
+# The if __name__ == '__main__' part is necessary for the worker processes on Windows.
+if __name__ == '__main__':
+    config = {
+        'user': 'root',
+        'password': '',
+        'host': 'localhost',
+        'database': 'ibex35',
+        'raise_on_warnings': True
+    }
+    cnx = mysql.connector.connect(**config)
+    cnx.isolation_level = None  			# To do auto-commit
+
+    #getList('IBEX-components.csv', 'IBEX35', cnx)
+    #recordData('IBEX_DATA.xlsx', cnx)
+    validateData(cnx)
+
+    cnx.close()
@@ -23,61 +23,17 @@ SCENARIO = 3
 DBFEED = False
 TRAILING = False
 
-from pyalgotrade import strategy, plotter, dataseries
+from pyalgotrade import strategy, plotter
 from pyalgotrade.technical import ma, macd, cross
-from pyalgotrade.stratanalyzer import drawdown, returns, sharpe
-from pyalgotrade.utils import stats
 import datetime
 import pyalgotrade.logger as logger
-import math
 from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
 from pyalgoext import dbfeed
 from pyalgotrade.barfeed import yahoofeed
-from pyalgotrade.talibext import indicator
-
-
-class SessionOpenStopOrder(backtesting.StopOrder):
-    def __init__(self, action, position, pricePer, quantity, instrumentTraits):
-        if action == broker.Order.Action.SELL:
-            pricePer = 1 - pricePer
-        else:
-            pricePer = 1 + pricePer
-        self._dateTime = position.getStrategy().getCurrentDateTime()
-        self._pricePer = pricePer
-        self._position = position
-
-        backtesting.StopOrder.__init__(self, action, position.getInstrument(), position.getLastPrice() * pricePer, quantity, instrumentTraits)
-        position.getStrategy().getBarsProcessedEvent().subscribe(self.__onBars)
-
-    def __onBars(self, strategy, bars):
-        instrument = self._position.getInstrument()
-        if self._dateTime.date != bars.getDateTime().date:
-            if instrument in bars:
-                self._StopOrder__stopPrice = bars[instrument].getPrice() * self._pricePer
-                self._dateTime = bars.getDateTime()
-
-
-class TrailingStopOrder(backtesting.StopOrder):
-    def __init__(self, action, position, pricePer, quantity, instrumentTraits):
-        backtesting.StopOrder.__init__(self, action, position.getInstrument(), 0, quantity, instrumentTraits)
-        if action == broker.Order.Action.SELL:
-            pricePer = 1 - pricePer
-        else:
-            pricePer = 1 + pricePer
-        self._pricePer = pricePer
-        self._position = position
-        self._refPrice = 0
-
-    def getStopPrice(self):
-        lastPrice = self._position.getLastPrice()
-        if self.getAction() == broker.Order.Action.SELL:
-            if self._refPrice < lastPrice:
-                self._refPrice = lastPrice
-        else:
-            if self._refPrice > lastPrice:
-                self._refPrice = lastPrice
-        return self._refPrice * self._pricePer
+from pyalgoext import aroon
+from pyalgoext import stops
+from pyalgoext import performance
 
 
 class MyBenchmark(strategy.BacktestingStrategy):
@@ -100,6 +56,7 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
         self._stopPer = stopPer
         self._stopTrailing = stopTrailing
+        self._stops = stops.StopManager(self)
 
         self.setUseAdjustedValues(True)
 
@@ -108,21 +65,15 @@ class MyBenchmark(strategy.BacktestingStrategy):
         if order.getAction() == broker.Order.Action.BUY:
             self.logOp("COMPRA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.SELL, position, self._stopPer, position.getShares(), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._stops.exitTrailing(position, self._stopPer, True)
             else:
-                position.exitStop(order.getExecutionInfo().getPrice() * (1 - self._stopPer), True)
+                self._stops.exitFixed(position, order.getExecutionInfo().getPrice() * (1 - self._stopPer), True)
         else:
             self.logOp("VENTA CORTA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.BUY_TO_COVER, position, self._stopPer, math.fabs(position.getShares()), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._stops.exitTrailing(position, self._stopPer, True)
             else:
-                position.exitStop(order.getExecutionInfo().getPrice() * (1 + self._stopPer), True)
+                self._stops.exitFixed(position, order.getExecutionInfo().getPrice() * (1 + self._stopPer), True)
 
     def onEnterCanceled(self, position):
         order = position.getEntryOrder()
@@ -250,7 +201,7 @@ class MyTaLibStrategy(MyBasicStrategy):
         self._aroon = {}
         self._aroonPeriod = aroonPeriod
         for instrument in feed.getRegisteredInstruments():
-            self._aroon[instrument] = dataseries.SequenceDataSeries()
+            self._aroon[instrument] = aroon.AroonOscillator(self.getFeed()[instrument], aroonPeriod)
 
     def onBars(self, bars):
         for instrument, bar in bars.items():
@@ -258,25 +209,24 @@ class MyTaLibStrategy(MyBasicStrategy):
             if not self._smaLong[instrument] or self._smaLong[instrument][-1] is None:
                 return
 
-            barDs = self.getFeed().getDataSeries(instrument)
-            #closeDs = barDs.getCloseDataSeries()
-            aroon = indicator.AROONOSC(barDs, self._aroonPeriod + 1, self._aroonPeriod)
-            self._aroon[instrument].appendWithDateTime(self.getCurrentDateTime(), aroon[-1])
+            aroonValue = self._aroon[instrument][-1]
+            if aroonValue is None:
+                continue
 
             pri = self._macdPrice[instrument]
             vol = self._macdVol[instrument]
             if instrument in self._posLong:
-                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] < -25:
+                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue < -25:
                     position = self._posLong[instrument]
                     self.prepareExit(position)
             elif instrument in self._posShort:
-                if cross.cross_above(pri.getSignal(), pri) and aroon[-1] > 25:
+                if cross.cross_above(pri.getSignal(), pri) and aroonValue > 25:
                     position = self._posShort[instrument]
                     self.prepareExit(position)
 
-            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] > 25:
+            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue > 25:
                 self.prepareEnter(instrument, bars)
-            elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroon[-1] < -25:
+            elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroonValue < -25:
                     self.prepareEnter(instrument, bars, broker.Order.Action.SELL_SHORT)
 
 # Modificaciones al modulo plotter
@@ -344,15 +294,8 @@ if __name__ == "__main__":
         myStrategy = MyBenchmark(feed, stopPer, TRAILING, smaLong)
 
     # Strategy
-    returnsAnalyzer = returns.Returns()
-    myStrategy.attachAnalyzer(returnsAnalyzer)
-    returnsAnalyzer.getReturns().setMaxLen(1000000)
-
-    sharpeAnalyzer = sharpe.SharpeRatio()
-    myStrategy.attachAnalyzer(sharpeAnalyzer)
-
-    drawDownAnalyzer = drawdown.DrawDown()
-    myStrategy.attachAnalyzer(drawDownAnalyzer)
+    reportAnalyzer = performance.PerformanceReport(0.0036)
+    myStrategy.attachAnalyzer(reportAnalyzer)
 
     # Attach a plotter to the strategy
     plt = plotter.StrategyPlotter(myStrategy, True)
@@ -377,18 +320,7 @@ if __name__ == "__main__":
     myStrategy.run()
 
     # Show basic information
-    allRet = returnsAnalyzer.getReturns()
-    capEnd = myStrategy.getBroker().getEquity()
-
-    myStrategy.info("CAPITAL FINAL: $%.4f" % capEnd)
-    myStrategy.info(" ")
-    myStrategy.info("Rentabilidad: %.4f%%" % (100 * (capEnd - capStart) / capStart))
-    myStrategy.info("Rentabilidad Anualizada: %.4f%%" % (100 * (math.pow((capEnd / capStart), (365.0 / ((myStrategy.endDateTime - myStrategy.startDateTime).days))) - 1)))
-    myStrategy.info("Volatilidad Anualizada: %.4f%%" % (100 * stats.stddev(allRet, 1) * math.sqrt(252)))
-    myStrategy.info("Ratio de Sharpe Anualizado: %.4f" % (100 * sharpeAnalyzer.getSharpeRatio(0.0036, True)))
-
-    myStrategy.info("DrawDown Maximo: %.4f%%" % (100 * drawDownAnalyzer.getMaxDrawDown()))
-    myStrategy.info("DrawDown Mas Largo: %s dias" % (drawDownAnalyzer.getLongestDrawDownDuration().days))
+    reportAnalyzer.logReport(myStrategy)
 
 
     from bokeh import mpl
@@ -19,44 +19,24 @@
 """
 
 DBFEED = True
+SNAPSHOT = 'snapshot' # Directory of the dato snapshot, None to query MySQL
 
-from pyalgotrade import strategy, dataseries
+from pyalgotrade import strategy
 from pyalgotrade.technical import ma, macd, cross
 import datetime
 import pyalgotrade.logger as logger
 import math
 from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
-from pyalgoext import dbfeed
+from pyalgoext import dbfeed, dbsnapshot
 from pyalgotrade.barfeed import yahoofeed
-from pyalgotrade.talibext import indicator
+from pyalgoext import aroon
+from pyalgoext import stops
 import itertools
 from pyalgotrade.optimizer import local
 import numpy as np
 
 
-class TrailingStopOrder(backtesting.StopOrder):
-    def __init__(self, action, position, pricePer, quantity, instrumentTraits):
-        backtesting.StopOrder.__init__(self, action, position.getInstrument(), 0, quantity, instrumentTraits)
-        if action == broker.Order.Action.SELL:
-            pricePer = 1 - pricePer
-        else:
-            pricePer = 1 + pricePer
-        self._pricePer = pricePer
-        self._position = position
-        self._refPrice = 0
-
-    def getStopPrice(self):
-        lastPrice = self._position.getLastPrice()
-        if self.getAction() == broker.Order.Action.SELL:
-            if self._refPrice < lastPrice:
-                self._refPrice = lastPrice
-        else:
-            if self._refPrice > lastPrice:
-                self._refPrice = lastPrice
-        return self._refPrice * self._pricePer
-
-
 class MyBenchmark(strategy.BacktestingStrategy):
     def __init__(self, feed, stopPer, stopTrailing, delay):
         myBroker = backtesting.Broker(1000000, feed, backtesting.TradePercentage(0.002))
@@ -77,6 +57,7 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
         self._stopPer = stopPer
         self._stopTrailing = stopTrailing
+        self._trailingStops = stops.TrailingStopBook(self)
 
         self.setUseAdjustedValues(True)
 
@@ -85,19 +66,13 @@ class MyBenchmark(strategy.BacktestingStrategy):
         if order.getAction() == broker.Order.Action.BUY:
             self.logOp("COMPRA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.SELL, position, self._stopPer, position.getShares(), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             else:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 - self._stopPer), True)
         else:
             self.logOp("VENTA CORTA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.BUY_TO_COVER, position, self._stopPer, math.fabs(position.getShares()), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             else:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 + self._stopPer), True)
 
@@ -178,8 +153,11 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
 class MyBasicStrategy(MyBenchmark):
     def __init__(self, feed, config, stopPer, stopTrailing, smaShort, smaLong):
-        if config['dbfeed']:
-            feed = dbfeed.DbFeed(config['db'], [], 100, config['startDate'], config['endDate'])
+        if config['dbfeed'] and config['snapshot']:
+            feed = dbsnapshot.SnapshotFeed(config['snapshot'], [], 100, config['startDate'], config['endDate'])
+            feed.registerInstrument(config['instrument'])
+        elif config['dbfeed']:
+            feed = dbfeed.DbFeed(config['db'], [], 100, config['startDate'], config['endDate'], config['prefetch'])
             feed.registerInstrument(config['instrument'])
         else:
             feed = yahoofeed.Feed()
@@ -237,7 +215,7 @@ class MyTaLibStrategy(MyBasicStrategy):
         self._aroon = {}
         self._aroonPeriod = aroonPeriod
         for instrument in feed.getRegisteredInstruments():
-            self._aroon[instrument] = dataseries.SequenceDataSeries()
+            self._aroon[instrument] = aroon.AroonOscillator(self.getFeed()[instrument], aroonPeriod)
 
     def onBars(self, bars):
         for instrument, bar in bars.items():
@@ -245,31 +223,31 @@ class MyTaLibStrategy(MyBasicStrategy):
             if not self._smaLong[instrument] or self._smaLong[instrument][-1] is None:
                 return
 
-            barDs = self.getFeed().getDataSeries(instrument)
-            aroon = indicator.AROONOSC(barDs, self._aroonPeriod + 1, self._aroonPeriod)
-            self._aroon[instrument].appendWithDateTime(self.getCurrentDateTime(), aroon[-1])
+            aroonValue = self._aroon[instrument][-1]
+            if aroonValue is None:
+                continue
 
             pri = self._macdPrice[instrument]
             vol = self._macdVol[instrument]
             if instrument in self._posLong:
-                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] < -25:
+                if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue < -25:
                     position = self._posLong[instrument]
                     self.prepareExit(position)
             elif instrument in self._posShort:
-                if cross.cross_above(pri.getSignal(), pri) and aroon[-1] > 25:
+                if cross.cross_above(pri.getSignal(), pri) and aroonValue > 25:
                     position = self._posShort[instrument]
                     self.prepareExit(position)
 
-            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] > 25:
+            if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue > 25:
                 self.prepareEnter(instrument, bars)
-            elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroon[-1] < -25:
+            elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroonValue < -25:
                     self.prepareEnter(instrument, bars, broker.Order.Action.SELL_SHORT)
 
 
-def parameters_generator():
-
-    config = {
+def get_config():
+    return {
         'dbfeed': DBFEED,
+        'snapshot': SNAPSHOT,
         'db': {'user': 'root',
                'password': 'root',
                'host': '127.0.0.1',
@@ -278,9 +256,15 @@ def parameters_generator():
                },
         'startDate': datetime.date(2001, 05, 24),
         'endDate': datetime.date(2015, 12, 21),
-        'instrument': 'GAS.MC'
+        'instrument': 'GAS.MC',
+        'prefetch': 250
     }
 
+
+def parameters_generator():
+
+    config = get_config()
+
     stopPer = np.arange(0.05, 0.95, 0.05)
 
     stopTrailing = [True, False]
@@ -298,6 +282,11 @@ if __name__ == '__main__':
 
     logger.log_format = "[%(levelname)s] %(message)s"
 
+    config = get_config()
+    if config['dbfeed'] and config['snapshot']:
+        # Only rebuilt when the dato or grupo tables changed
+        dbsnapshot.export(config['db'], config['snapshot'])
+
     feed = yahoofeed.Feed()
 
     local.run(MyBasicStrategy, feed, parameters_generator())
@@ -19,8 +19,11 @@
 """
 
 DBFEED = False
+SEARCH = 'halving'  # grid, random, lhs or halving
+SAMPLES = 2000
+MAX_SECONDS = 8 * 3600
 
-from pyalgotrade import strategy, dataseries
+from pyalgotrade import strategy
 from pyalgotrade.technical import ma, macd, cross
 import datetime
 import pyalgotrade.logger as logger
@@ -29,34 +32,12 @@ from pyalgotrade import broker
 from pyalgotrade.broker import backtesting
 from pyalgoext import dbfeed
 from pyalgotrade.barfeed import yahoofeed
-from pyalgotrade.talibext import indicator
-import itertools
-from pyalgotrade.optimizer import local
+from pyalgoext import aroon
+from pyalgoext import stops
+from pyalgoext import optimizer
 import numpy as np
 
 
-class TrailingStopOrder(backtesting.StopOrder):
-    def __init__(self, action, position, pricePer, quantity, instrumentTraits):
-        backtesting.StopOrder.__init__(self, action, position.getInstrument(), 0, quantity, instrumentTraits)
-        if action == broker.Order.Action.SELL:
-            pricePer = 1 - pricePer
-        else:
-            pricePer = 1 + pricePer
-        self._pricePer = pricePer
-        self._position = position
-        self._refPrice = 0
-
-    def getStopPrice(self):
-        lastPrice = self._position.getLastPrice()
-        if self.getAction() == broker.Order.Action.SELL:
-            if self._refPrice < lastPrice:
-                self._refPrice = lastPrice
-        else:
-            if self._refPrice > lastPrice:
-                self._refPrice = lastPrice
-        return self._refPrice * self._pricePer
-
-
 class MyBenchmark(strategy.BacktestingStrategy):
     def __init__(self, feed, stopPer, stopTrailing, delay):
         myBroker = backtesting.Broker(1000000, feed, backtesting.TradePercentage(0.002))
@@ -77,6 +58,7 @@ class MyBenchmark(strategy.BacktestingStrategy):
 
         self._stopPer = stopPer
         self._stopTrailing = stopTrailing
+        self._trailingStops = stops.TrailingStopBook(self)
 
         self.setUseAdjustedValues(True)
 
@@ -85,19 +67,13 @@ class MyBenchmark(strategy.BacktestingStrategy):
         if order.getAction() == broker.Order.Action.BUY:
             self.logOp("COMPRA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.SELL, position, self._stopPer, position.getShares(), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             else:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 - self._stopPer), True)
         else:
             self.logOp("VENTA CORTA", order)
             if self._stopTrailing:
-                stopOrder = TrailingStopOrder(broker.Order.Action.BUY_TO_COVER, position, self._stopPer, math.fabs(position.getShares()), order.getInstrumentTraits())
-                stopOrder.setGoodTillCanceled(True)
-                position._Position__submitAndRegisterOrder(stopOrder)
-                position._Position__exitOrder = stopOrder
+                self._trailingStops.exitTrailing(position, self._stopPer, True)
             else:
                 position.exitStop(order.getExecutionInfo().getPrice() * (1 + self._stopPer), True)
 
@@ -236,7 +212,7 @@ class MyTaLibStrategy(MyBasicStrategy):
             self._aroonIn = aroonIn
             self._aroonOut = aroonOut
             for instrument in feed.getRegisteredInstruments():
-                self._aroon[instrument] = dataseries.SequenceDataSeries()
+                self._aroon[instrument] = aroon.AroonOscillator(self.getFeed()[instrument], aroonPeriod)
             self._active = True
         except:
             pass
@@ -249,57 +225,52 @@ class MyTaLibStrategy(MyBasicStrategy):
                 if not self._smaLong[instrument] or self._smaLong[instrument][-1] is None:
                     return
 
-                barDs = self.getFeed().getDataSeries(instrument)
-                aroon = indicator.AROONOSC(barDs, self._aroonPeriod + 1, self._aroonPeriod)
-                self._aroon[instrument].appendWithDateTime(self.getCurrentDateTime(), aroon[-1])
+                aroonValue = self._aroon[instrument][-1]
+                if aroonValue is None:
+                    continue
 
                 pri = self._macdPrice[instrument]
                 vol = self._macdVol[instrument]
                 if instrument in self._posLong:
-                    if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] < -self._aroonOut:
+                    if cross.cross_below(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue < -self._aroonOut:
                         position = self._posLong[instrument]
                         self.prepareExit(position)
                 elif instrument in self._posShort:
-                    if cross.cross_above(pri.getSignal(), pri) and aroon[-1] > 25:
+                    if cross.cross_above(pri.getSignal(), pri) and aroonValue > 25:
                         position = self._posShort[instrument]
                         self.prepareExit(position)
 
-                if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroon[-1] > 25:
+                if cross.cross_above(self._smaShort[instrument], self._smaLong[instrument]) and aroonValue > 25:
                     self.prepareEnter(instrument, bars)
-                elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroon[-1] < -self._aroonIn:
+                elif cross.cross_below(pri.getSignal(), pri) and cross.cross_above(vol.getSignal(), vol) and aroonValue < -self._aroonIn:
                         self.prepareEnter(instrument, bars, broker.Order.Action.SELL_SHORT)
 
 
-def parameters_generator():
-
-    stopPer = np.arange(0.05, 0.95, 0.05)
-
-    stopTrailing = [True, False]
-
-    smaShort = range(10, 100, 10)
-
-    smaLong = range(50, 500, 10)
-
-    macdPriceShort = range(5, 50)
+def parameters_space():
+    return optimizer.SearchSpace([
+        ('stopPer', np.arange(0.05, 0.95, 0.05)),
+        ('stopTrailing', [True, False]),
+        ('smaShort', range(10, 100, 10)),
+        ('smaLong', range(50, 500, 10)),
+        ('macdPriceShort', range(5, 50)),
+        ('macdPriceLong', range(5, 50)),
+        ('macdPriceSignal', range(5, 50)),
+        ('macdVolShort', range(5, 50)),
+        ('macdVolLong', range(5, 50)),
+        ('macdVolSignal', range(5, 50)),
+        ('aroonPeriod', range(5, 50)),
+        ('aroonIn', range(5, 95)),
+        ('aroonOut', range(5, 95))
+    ])
 
-    macdPriceLong = range(5, 50)
 
-    macdPriceSignal = range(5, 50)
-
-    macdVolShort = range(5, 50)
-
-    macdVolLong = range(5, 50)
-
-    macdVolSignal = range(5, 50)
-
-    aroonPeriod = range(5, 50)
-
-    aroonIn = range(5, 95)
-
-    aroonOut = range(5, 95)
-
-    return itertools.product(stopPer, stopTrailing, smaShort, smaLong, macdPriceShort, macdPriceLong, macdPriceSignal, macdVolShort,
-        macdVolLong, macdVolSignal, aroonPeriod, aroonIn, aroonOut)
+def parameters_generator():
+    space = parameters_space()
+    if SEARCH == 'random':
+        return space.random(SAMPLES)
+    elif SEARCH in ['lhs', 'halving']:
+        return space.latinHypercube(SAMPLES)
+    return space.grid()
 
 
 # The if __name__ == '__main__' part is necessary if running on Windows.
@@ -331,4 +302,7 @@ if __name__ == '__main__':
         feed.sanitizeBars(True)
         feed.addBarsFromCSV(instrument, instrument + ".csv")
 
-    local.run(MyTaLibStrategy, feed, parameters_generator())
+    if SEARCH == 'halving':
+        optimizer.run_halving(MyTaLibStrategy, feed, parameters_generator(), resultsFile="OptimizerLocal2.csv", maxSeconds=MAX_SECONDS)
+    else:
+        optimizer.run(MyTaLibStrategy, feed, parameters_generator(), resultsFile="OptimizerLocal2.csv", maxSeconds=MAX_SECONDS)
@@ -0,0 +1,59 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+CROSSCHECK = 10
+
+import itertools
+import time
+from pyalgotrade.barfeed import yahoofeed
+from pyalgoext import optimizer, vectorized
+
+
+def parameters_generator():
+    smaShort = range(10, 100, 10)
+
+    smaLong = range(50, 500, 10)
+
+    stopPer = [None, 0.05, 0.10, 0.20]
+
+    return [p for p in itertools.product(smaShort, smaLong, stopPer) if p[0] < p[1]]
+
+
+if __name__ == '__main__':
+    instrument = 'GAS.MC'
+
+    feed = yahoofeed.Feed()
+    feed.sanitizeBars(True)
+    feed.addBarsFromCSV(instrument, instrument + ".csv")
+    store = optimizer.BarStore.fromFeed(feed)
+
+    parameters = parameters_generator()
+
+    start = time.time()
+    results = vectorized.SmaCrossEngine(store.getValues(instrument)).run(parameters)
+    print "%d combinations in %.2f seconds" % (len(parameters), time.time() - start)
+
+    best, finalEquity = results.getBest()
+    print "Best %s: %.2f" % (best, finalEquity)
+
+    if CROSSCHECK:
+        for combination, fast, slow in vectorized.crosscheck(store, instrument, parameters, CROSSCHECK):
+            print "%s vectorized %.2f event-driven %.2f" % (combination, fast, slow)
@@ -0,0 +1,92 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+from collections import deque
+
+from pyalgotrade import technical
+from pyalgotrade.dataseries import bards
+
+
+class AroonOscillatorEventWindow(technical.EventWindow):
+    # Monotonic deques of (position, value) keep the highest high and the lowest low
+    # of the last period + 1 bars, so each bar costs O(1) amortized.
+    # Like TA-Lib, on ties the most recent bar wins.
+
+    def __init__(self, period):
+        assert(period > 1)
+        super(AroonOscillatorEventWindow, self).__init__(period + 1)
+        self.__period = period
+        self.__factor = 100.0 / period
+        self.__highs = deque()
+        self.__lows = deque()
+        self.__pos = -1
+        self.__value = None
+
+    def onNewValue(self, dateTime, value):
+        if value is None:
+            return
+
+        self.__pos += 1
+        pos = self.__pos
+        high = value.getHigh()
+        low = value.getLow()
+
+        while self.__highs and self.__highs[-1][1] <= high:
+            self.__highs.pop()
+        self.__highs.append((pos, high))
+        while self.__lows and self.__lows[-1][1] >= low:
+            self.__lows.pop()
+        self.__lows.append((pos, low))
+
+        trailing = pos - self.__period
+        while self.__highs[0][0] < trailing:
+            self.__highs.popleft()
+        while self.__lows[0][0] < trailing:
+            self.__lows.popleft()
+
+        if trailing >= 0:
+            self.__value = self.__factor * (self.__highs[0][0] - self.__lows[0][0])
+
+    def windowFull(self):
+        return self.__pos >= self.__period
+
+    def getValue(self):
+        return self.__value
+
+
+class AroonOscillator(technical.EventBasedFilter):
+    """Aroon Oscillator filter, giving the same values as TA-Lib AROONOSC without recalculating the whole window.
+
+    :param barDataSeries: The BarDataSeries instance being filtered.
+    :type barDataSeries: :class:`pyalgotrade.dataseries.bards.BarDataSeries`.
+    :param period: The number of periods. Must be > 1.
+    :type period: int.
+    :param maxLen: The maximum number of values to hold.
+        Once a bounded length is full, when new items are added, a corresponding number of items are discarded from the
+        opposite end. If None then dataseries.DEFAULT_MAX_LEN is used.
+    :type maxLen: int.
+    """
+
+    def __init__(self, barDataSeries, period, maxLen=None):
+        if not isinstance(barDataSeries, bards.BarDataSeries):
+            raise Exception("barDataSeries must be a dataseries.bards.BarDataSeries instance")
+
+        super(AroonOscillator, self).__init__(barDataSeries, AroonOscillatorEventWindow(period), maxLen)
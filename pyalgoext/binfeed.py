@@ -0,0 +1,315 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import csv
+import datetime
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade import dataseries
+from pyalgotrade.barfeed import common
+
+
+######################################################################
+## Binary store of a directory of Yahoo CSV files
+#
+# Files are named <instrument>-<year>.csv (or <instrument>.csv) with the columns:
+# Date,Open,High,Low,Close,Volume,Adj Close
+#
+# Layout:
+# <store>/index.json    signature of the CSV files and the [offset, count] of each instrument
+# <store>/dates.npy     the sessions of every instrument, one after the other (datetime64[D])
+# <store>/values.npy    open, high, low, close, volume and adjusted close aligned with dates.npy (float64)
+#
+# The rows of each instrument are sorted ascending and without duplicates, so a date
+# range is found with a binary search on its slice.
+
+INDEX = 'index.json'
+DATES = 'dates.npy'
+VALUES = 'values.npy'
+COLUMNS = 6
+
+FILE_NAME = re.compile(r"^(.+?)(?:-(\d{4}))?\.csv$")
+
+
+def to_datetime64(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def to_datetime(value):
+    return datetime.datetime.combine(value.astype(datetime.date), datetime.time.min)
+
+
+def get_store_directory(csvDirectory):
+    return os.path.normpath(csvDirectory) + '.bin'
+
+
+def get_signature(csvDirectory):
+    ret = {}
+    for fileName in sorted(os.listdir(csvDirectory)):
+        if FILE_NAME.match(fileName):
+            stat = os.stat(os.path.join(csvDirectory, fileName))
+            ret[fileName] = [stat.st_size, int(stat.st_mtime)]
+    return ret
+
+
+def load_index(storeDirectory):
+    path = os.path.join(storeDirectory, INDEX)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fileIn:
+        return json.load(fileIn)
+
+
+def parse_csv(path):
+    """Returns {date: [open, high, low, close, volume, adjClose]} of a Yahoo CSV file, skipping null rows."""
+    ret = {}
+    with open(path) as fileIn:
+        reader = csv.reader(fileIn)
+        header = next(reader)
+        # Some files swap the Volume and Adj Close columns.
+        columns = [header.index(name) for name in ["Open", "High", "Low", "Close", "Volume", "Adj Close"]]
+        for row in reader:
+            if len(row) < len(header):
+                continue
+            try:
+                values = [float(row[column]) for column in columns]
+            except ValueError:
+                continue
+            # Sample: 2010-12-30
+            ret[datetime.date(int(row[0][0:4]), int(row[0][5:7]), int(row[0][8:10]))] = values
+    return ret
+
+
+def compile_directory(csvDirectory, storeDirectory=None, force=False):
+    """Compiles every Yahoo CSV file of a directory into a binary store.
+
+    The store is only rebuilt when a CSV file was added, removed or modified.
+
+    :param csvDirectory: the directory with the CSV files, like data/.
+    :param storeDirectory: the directory to write the store to. Defaults to csvDirectory + '.bin'.
+    :param force: rebuild the store even if it is up to date.
+    :rtype: True if the store was rebuilt.
+    """
+    if storeDirectory is None:
+        storeDirectory = get_store_directory(csvDirectory)
+
+    signature = get_signature(csvDirectory)
+    index = load_index(storeDirectory)
+    if not force and index is not None and index['signature'] == signature:
+        return False
+
+    files = {}
+    for fileName in signature.keys():
+        instrument = FILE_NAME.match(fileName).group(1)
+        files.setdefault(instrument, []).append(fileName)
+
+    instruments = {}
+    allDates = []
+    allValues = []
+    offset = 0
+    for instrument in sorted(files.keys()):
+        rows = {}
+        # Sorted by year, so a later file wins on overlapping sessions.
+        for fileName in sorted(files[instrument]):
+            rows.update(parse_csv(os.path.join(csvDirectory, fileName)))
+        dates = sorted(rows.keys())
+        allDates.extend(dates)
+        allValues.extend(rows[date] for date in dates)
+        instruments[instrument] = [offset, len(dates)]
+        offset += len(dates)
+
+    tmpDirectory = storeDirectory.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmpDirectory):
+        shutil.rmtree(tmpDirectory)
+    os.makedirs(tmpDirectory)
+
+    np.save(os.path.join(tmpDirectory, DATES), np.array(allDates, dtype='datetime64[D]'))
+    np.save(os.path.join(tmpDirectory, VALUES), np.array(allValues, dtype=float).reshape(-1, COLUMNS))
+    with open(os.path.join(tmpDirectory, INDEX), 'w') as fileOut:
+        json.dump({
+            'signature': signature,
+            'instruments': instruments,
+        }, fileOut, indent=2)
+
+    if os.path.exists(storeDirectory):
+        shutil.rmtree(storeDirectory)
+    os.rename(tmpDirectory, storeDirectory)
+    return True
+
+
+class BinaryStore(object):
+    """Read access to a store written by :func:`compile_directory`.
+    Both arrays are memory-mapped, so opening it costs the same regardless of its size.
+
+    :param storeDirectory: the store directory.
+    """
+
+    def __init__(self, storeDirectory):
+        index = load_index(storeDirectory)
+        if index is None:
+            raise Exception("No binary store found at %s" % storeDirectory)
+        self.__instruments = index['instruments']
+        self.__dates = np.load(os.path.join(storeDirectory, DATES), mmap_mode='r')
+        self.__values = np.load(os.path.join(storeDirectory, VALUES), mmap_mode='r')
+
+    @classmethod
+    def fromDirectory(cls, csvDirectory):
+        """Opens the store of a CSV directory, compiling it first if it is missing or stale."""
+        storeDirectory = get_store_directory(csvDirectory)
+        compile_directory(csvDirectory, storeDirectory)
+        return cls(storeDirectory)
+
+    def getInstruments(self):
+        return sorted(self.__instruments.keys())
+
+    def hasInstrument(self, instrument):
+        return instrument in self.__instruments
+
+    def getRange(self, instrument, fromDateTime=None, toDateTime=None):
+        """Returns the [start, end) positions of the sessions of an instrument within the dates, both included."""
+        offset, count = self.__instruments[instrument]
+        start = offset
+        end = offset + count
+        dates = self.__dates[start:end]
+        if fromDateTime is not None:
+            start = offset + np.searchsorted(dates, to_datetime64(fromDateTime), 'left')
+        if toDateTime is not None:
+            end = offset + np.searchsorted(dates, to_datetime64(toDateTime), 'right')
+        return start, end
+
+    def getDates(self):
+        return self.__dates
+
+    def getValues(self):
+        return self.__values
+
+
+class Feed(barfeed.BaseBarFeed):
+    """A daily :class:`pyalgotrade.barfeed.BaseBarFeed` serving bars straight from a :class:`BinaryStore`,
+    in place of a :class:`pyalgotrade.barfeed.yahoofeed.Feed` loading the same CSV files.
+
+    :param store: the :class:`BinaryStore` to read from.
+    :param maxLen: The maximum number of values that the :class:`pyalgotrade.dataseries.bards.BarDataSeries` will hold.
+    :type maxLen: int.
+    """
+
+    def __init__(self, store, maxLen=dataseries.DEFAULT_MAX_LEN):
+        barfeed.BaseBarFeed.__init__(self, bar.Frequency.DAY, maxLen)
+        self.__store = store
+        self.__ranges = {}
+        self.__sanitizeBars = False
+        self.__started = False
+        self.__dateTimes = []
+        self.__rows = {}
+        self.__positions = {}
+        self.__nextPos = 0
+        self.__currDateTime = None
+
+    def sanitizeBars(self, sanitize):
+        self.__sanitizeBars = sanitize
+
+    def addBarsFromStore(self, instrument, fromDateTime=None, toDateTime=None):
+        """Adds the bars of an instrument between two dates, both included.
+        Like adding several CSV files of the same instrument, ranges accumulate.
+        """
+        if self.__started:
+            raise Exception("Can't add more bars once you started consuming bars")
+        if not self.__store.hasInstrument(instrument):
+            raise Exception("Instrument %s not found in the binary store" % instrument)
+
+        self.__ranges.setdefault(instrument, []).append(self.__store.getRange(instrument, fromDateTime, toDateTime))
+        self.registerInstrument(instrument)
+
+    def __buildTimeline(self):
+        dates = self.__store.getDates()
+        values = self.__store.getValues()
+        selected = {}
+        for instrument, ranges in self.__ranges.items():
+            selected[instrument] = np.unique(np.concatenate([np.arange(start, end) for start, end in ranges]))
+        timeline = np.unique(np.concatenate([dates[rows] for rows in selected.values()] + [np.array([], dtype='datetime64[D]')]))
+        self.__dateTimes = [to_datetime(date) for date in timeline]
+
+        # Session number and values of every bar, read from the memory map in one go.
+        self.__rows = {}
+        for instrument, rows in selected.items():
+            self.__rows[instrument] = (np.searchsorted(timeline, dates[rows]).tolist(), values[rows].tolist())
+        self.__positions = dict((instrument, 0) for instrument in self.__rows.keys())
+
+    def reset(self):
+        self.__buildTimeline()
+        self.__nextPos = 0
+        self.__currDateTime = None
+        super(Feed, self).reset()
+
+    def start(self):
+        super(Feed, self).start()
+        if not self.__started:
+            self.__buildTimeline()
+        self.__started = True
+
+    def stop(self):
+        pass
+
+    def join(self):
+        pass
+
+    def barsHaveAdjClose(self):
+        return True
+
+    def getCurrentDateTime(self):
+        return self.__currDateTime
+
+    def peekDateTime(self):
+        ret = None
+        if self.__nextPos < len(self.__dateTimes):
+            ret = self.__dateTimes[self.__nextPos]
+        return ret
+
+    def eof(self):
+        return self.__nextPos >= len(self.__dateTimes)
+
+    def getNextBars(self):
+        if self.eof():
+            return None
+
+        dateTime = self.__dateTimes[self.__nextPos]
+        ret = {}
+        for instrument, (sessions, values) in self.__rows.items():
+            pos = self.__positions[instrument]
+            if pos < len(sessions) and sessions[pos] == self.__nextPos:
+                open_, high, low, close, volume, adjClose = values[pos]
+                if self.__sanitizeBars:
+                    open_, high, low, close = common.sanitize_ohlc(open_, high, low, close)
+                ret[instrument] = bar.BasicBar(dateTime, open_, high, low, close, volume, adjClose, bar.Frequency.DAY)
+                self.__positions[instrument] = pos + 1
+
+        self.__currDateTime = dateTime
+        self.__nextPos += 1
+        return bar.Bars(ret)
@@ -20,33 +20,20 @@
 """
 
 
-import csv
 import datetime
 from lxml import html
 import requests
+from pyalgoext import membership
 
-def getList(idxCsv, idxDateTime=None):
+def getTimeline(idxCsv, index=None):
+    return membership.MembershipTimeline.fromCsv(idxCsv, index)
+
+def getList(idxCsv, idxDateTime=None, timeline=None):
     if not idxDateTime:
         idxDateTime = datetime.datetime.now()
-    with open(idxCsv, "rU") as fileIn:
-        csvIn = csv.reader(fileIn)
-        csvIn.next()
-        idxList = []
-        for row in csvIn:
-            evtDateTime = datetime.datetime.strptime(row[0],"%Y-%m-%d")
-            if evtDateTime > idxDateTime:
-                break
-            for symbol in row[1].split():
-                if symbol in idxList:
-                    print("%s - symbol %s already in index" % (evtDateTime, symbol))
-                else:
-                    idxList.append(symbol)
-            for symbol in row[2].split():
-                if symbol in idxList:
-                    idxList.remove(symbol)
-                else:
-                    print("%s - symbol %s not in index" % (evtDateTime, symbol))
-    return idxList
+    if timeline is None:
+        timeline = getTimeline(idxCsv)
+    return list(timeline.getMembers(None, idxDateTime))
 
 def getListFromYahoo(index):
     components = []
@@ -20,6 +20,7 @@
 """
 
 
+import array
 import mysql.connector
 import pyalgotrade.bar as bars
 import pyalgotrade.barfeed as barfeed
@@ -27,34 +28,91 @@ from pyalgotrade.barfeed import membf
 from pyalgotrade import bar
 from pyalgotrade import dataseries
 from pyalgotrade.utils import dt
+from pyalgoext import membership
 import datetime
 
 def normalize_instrument(instrument):
     return instrument.upper()
 
 
+class FieldTable(object):
+    """The field names of a feed and their position in the values of each :class:`DbBar`.
+    One table is shared by all the bars with the same fields."""
+
+    __tables = {}
+
+    def __init__(self, names):
+        self.__names = tuple(names)
+        self.__positions = dict((name, pos) for pos, name in enumerate(self.__names))
+
+    @classmethod
+    def get(cls, names):
+        names = tuple(names)
+        ret = FieldTable.__tables.get(names)
+        if ret is None:
+            ret = cls(names)
+            FieldTable.__tables[names] = ret
+        return ret
+
+    def getNames(self):
+        return self.__names
+
+    def getPosition(self, name):
+        return self.__positions.get(name)
+
+
+NAN = float('nan')
+
+
 class DbBar(bar.BasicBar):
+    # Fields are held in a float array laid out by a shared FieldTable, NaN when missing,
+    # instead of a dict per bar.
+    __slots__ = ('__table', '__values')
 
     PRICE_FIELD = 'CLOSE'
     PRICE_FIELDS = ['OPEN', 'HIGH', 'LOW', PRICE_FIELD, 'VOL', 'ADJ']
 
-    def __init__(self, dateTime, fields, frequency):
+    def __init__(self, dateTime, fields, frequency, table=None):
+        # fields is either a dict of field: value or, with a table, the list of values in its order.
+        if table is None:
+            table = FieldTable.get(sorted(fields.keys()))
+            fields = [fields[name] for name in table.getNames()]
+        self.__table = table
+        self.__values = array.array('d', [NAN if value is None else float(value) for value in fields])
+
         v = []
         for param in DbBar.PRICE_FIELDS:
             if param == None:
                 v.append(0)
             else:
-                v.append(float(fields[param]))
+                value = self.getField(param)
+                if value is None:
+                    raise KeyError(param)
+                v.append(value)
         bar.BasicBar.__init__(self, dateTime, v[0], v[1], v[2], v[3], v[4], v[5], frequency)
-        self.__fields = fields
+
+    def __getstate__(self):
+        return (bar.BasicBar.__getstate__(self), self.__table.getNames(), self.__values.tolist())
+
+    def __setstate__(self, state):
+        bar.BasicBar.__setstate__(self, state[0])
+        self.__table = FieldTable.get(state[1])
+        self.__values = array.array('d', state[2])
 
     def getField(self, key):
-        if key in self.__fields:
-            return self.__fields[key]
+        pos = self.__table.getPosition(key)
+        if pos is not None:
+            value = self.__values[pos]
+            if value == value:
+                return value
         return None
 
     def getFields(self):
-        return self.__fields
+        ret = {}
+        for name, value in zip(self.__table.getNames(), self.__values):
+            if value == value:
+                ret[name] = value
+        return ret
 
 
 # MySQL Database
@@ -95,6 +153,9 @@ class Database():
         cursor.close()
         return ret
 
+    def getTimeline(self):
+        return membership.MembershipTimeline.fromDatabase(self.__connection)
+
     def getDates(self, fromDateTime=None, toDateTime=None):
         sql = "select distinct(fecha) from dato"
         args = []
@@ -141,36 +202,148 @@ class Database():
             cursor = self.__connection.cursor()
             cursor.execute(sql, args)
 
+            table = FieldTable.get(self.__fields)
+            pricePos = table.getPosition(self.__priceField)
             lastInstrument = None
-            fields = {}
+            values = [None] * len(self.__fields)
             for instrument, criteria, value in cursor:
                 if lastInstrument is None:
                     lastInstrument = instrument
                 if lastInstrument != instrument:
-                    if self.__priceField in fields:
-                        ret[lastInstrument] = DbBar(dateTime, fields, frequency)
+                    if values[pricePos] is not None:
+                        ret[lastInstrument] = DbBar(dateTime, values, frequency, table)
                     lastInstrument = instrument
-                    fields = {}
-                fields[criteria] = value
-            if self.__priceField in fields:
-                ret[lastInstrument] = DbBar(dateTime, fields, frequency)
+                    values = [None] * len(self.__fields)
+                values[table.getPosition(criteria)] = value
+            if values[pricePos] is not None:
+                ret[lastInstrument] = DbBar(dateTime, values, frequency, table)
             cursor.close()
         return ret
 
+    def getFields(self):
+        return self.__fields
+
+    def getRows(self, instruments, fromDateTime, toDateTime):
+        # One query for a whole window of sessions. Rows are returned as
+        # {dateTime: {instrument: [value per field]}} to keep the buffer compact.
+        ret = {}
+        instNum = len(instruments)
+        if instNum > 0:
+            instFields = (','.join(["%s"] * instNum))
+
+            sql = "select fecha, activo, criterio, valor" \
+                " from dato where fecha >= %s and fecha <= %s and activo IN (%s) and criterio IN (%s)"
+            sql = sql % ('%s', '%s', instFields, self.__sqlFields)
+
+            args = [fromDateTime, toDateTime]
+            args.extend(instruments)
+            args.extend(self.__fields)
+
+            cursor = self.__connection.cursor()
+            cursor.execute(sql, args)
+
+            fieldPos = dict((field, pos) for pos, field in enumerate(self.__fields))
+            fieldNum = len(self.__fields)
+            for dateTime, instrument, criteria, value in cursor:
+                if not isinstance(dateTime, datetime.datetime):
+                    dateTime = datetime.datetime.combine(dateTime, datetime.time.min)
+                rows = ret.setdefault(dateTime, {})
+                values = rows.get(instrument)
+                if values is None:
+                    values = [None] * fieldNum
+                    rows[instrument] = values
+                values[fieldPos[criteria]] = value
+            cursor.close()
+        return ret
+
+
+class PrefetchWindow(object):
+    """Serves bars from a buffer holding a window of upcoming sessions,
+    so the database is queried once per window instead of once per session.
+
+    :param db: the :class:`Database` to load rows from.
+    :param dates: the ordered list of sessions of the feed.
+    :param sessions: the number of sessions to load on each refill.
+    :param maxRows: optional cap on the number of (session, instrument) rows held in memory.
+    """
+
+    def __init__(self, db, dates, sessions, maxRows=None):
+        assert(sessions > 0)
+        self.__db = db
+        self.__dates = dates
+        self.__sessions = sessions
+        self.__maxRows = maxRows
+        self.__rows = {}
+        self.__loaded = set()
+        self.__startPos = 0
+        self.__endPos = 0
+
+    def __getSize(self, instNum):
+        size = self.__sessions
+        if self.__maxRows is not None and instNum > 0:
+            size = min(size, max(1, self.__maxRows // instNum))
+        return size
+
+    def __load(self, instruments, startPos, endPos):
+        rows = self.__db.getRows(instruments, self.__dates[startPos], self.__dates[endPos - 1])
+        for dateTime, instRows in rows.items():
+            self.__rows.setdefault(dateTime, {}).update(instRows)
+
+    def __refill(self, instruments, datePos):
+        self.__rows = {}
+        self.__loaded = set(instruments)
+        self.__startPos = datePos
+        self.__endPos = min(len(self.__dates), datePos + self.__getSize(len(instruments)))
+        self.__load(instruments, self.__startPos, self.__endPos)
+
+    def getBars(self, instruments, frequency, datePos):
+        if not self.__startPos <= datePos < self.__endPos:
+            self.__refill(instruments, datePos)
+        else:
+            # Sessions behind the cursor are no longer needed.
+            for pos in range(self.__startPos, datePos):
+                self.__rows.pop(self.__dates[pos], None)
+            self.__startPos = datePos
+            # New instruments (e.g. index inclusions) are loaded up to the end of the window.
+            missing = [instrument for instrument in instruments if instrument not in self.__loaded]
+            if missing:
+                self.__loaded.update(missing)
+                self.__load(missing, datePos, self.__endPos)
+
+        dateTime = self.__dates[datePos]
+        table = FieldTable.get(self.__db.getFields())
+        pricePos = table.getPosition(DbBar.PRICE_FIELD)
+        ret = {}
+        instRows = self.__rows.pop(dateTime, {})
+        for instrument in instruments:
+            values = instRows.get(instrument)
+            if values is not None and values[pricePos] is not None:
+                ret[instrument] = DbBar(dateTime, values, frequency, table)
+        return ret
+
 
 class DbFeed(barfeed.BaseBarFeed):
-    def __init__(self, config, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None):
+    def __init__(self, config, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None, prefetch=None, prefetchMaxRows=None):
         barfeed.BaseBarFeed.__init__(self, bar.Frequency.DAY, maxLen)
-        self.__db = Database(config, fields)
+        self.__db = self.createDatabase(config, fields)
+        self.__prefetch = prefetch
+        self.__prefetchMaxRows = prefetchMaxRows
+        self.__window = None
         self.__eof = False
         self.__startDateTime = startDateTime
         self.__endDateTime = endDateTime
         self.__indices = []
         self.__instruments = []
+        self.__timeline = None
+        self.__positions = None
+        self.__members = []
 
     def barsHaveAdjClose(self):
         return True
 
+    def createDatabase(self, config, fields):
+        return Database(config, fields)
+
     def getDatabase(self):
         return self.__db
 
@@ -180,6 +353,11 @@ class DbFeed(barfeed.BaseBarFeed):
         self.__dates = self.__db.getDates(self.__startDateTime, self.__endDateTime)
         self.__dateTime = None
         self.__datePos = -1
+        self.__positions = None
+        if self.__indices and self.__timeline is None:
+            self.__timeline = self.__db.getTimeline()
+        if self.__prefetch:
+            self.__window = PrefetchWindow(self.__db, self.__dates, self.__prefetch, self.__prefetchMaxRows)
         self.getNextDatePos()
         self.getNextDateTime()
 
@@ -215,20 +393,31 @@ class DbFeed(barfeed.BaseBarFeed):
             return True
         return False
 
+    def getTimeline(self):
+        return self.__timeline
+
+    def setTimeline(self, timeline):
+        # Share a :class:`pyalgoext.membership.MembershipTimeline` instead of loading it on start.
+        self.__timeline = timeline
+
     def getMembers(self):
         return self.__members
 
     def getNextMembers(self):
-        members = []
         if len(self.__indices) > 0:
-            for index in self.__indices:
-                candidates = self.__db.getMembers(index, self.__dateTime)
-                for candidate in candidates:
-                    if candidate not in members:
-                        members.append(candidate)
-                        if candidate not in self.__instruments:
-                            self.__instruments.append(candidate)
-            self.__members = members
+            positions = [self.__timeline.getPosition(index, self.__dateTime) for index in self.__indices]
+            if positions != self.__positions:
+                # Membership only changes a few times a year
+                self.__positions = positions
+                members = []
+                for index, position in zip(self.__indices, positions):
+                    for candidate in self.__timeline.getMembersAt(index, position):
+                        if candidate not in members:
+                            members.append(candidate)
+                self.__members = members
+            for candidate in self.__members:
+                if candidate not in self.__instruments:
+                    self.__instruments.append(candidate)
         else:
             self.__members = self.getRegisteredInstruments()
             self.__instruments = self.getRegisteredInstruments()
@@ -237,7 +426,10 @@ class DbFeed(barfeed.BaseBarFeed):
         self.getNextDateTime()
         self.getNextMembers()
 
-        ret = self.__db.getBars(self.__instruments, self.getFrequency(), self.__dateTime)
+        if self.__window:
+            ret = self.__window.getBars(self.__instruments, self.getFrequency(), self.__datePos)
+        else:
+            ret = self.__db.getBars(self.__instruments, self.getFrequency(), self.__dateTime)
         for i in range(len(self.__instruments) - 1, -1, -1):
             instrument = self.__instruments[i]
             if instrument not in ret:
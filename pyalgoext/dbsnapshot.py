@@ -0,0 +1,275 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import csv
+import datetime
+import json
+import os
+import shutil
+
+import mysql.connector
+import numpy as np
+from pyalgotrade import dataseries
+
+from pyalgoext import dbfeed, membership
+
+
+######################################################################
+## Columnar snapshot of the dato / grupo tables
+#
+# Layout:
+# <directory>/manifest.json     signature of the tables, instruments and fields
+# <directory>/fecha.npy         every session in the table (datetime64[D])
+# <directory>/grupo.csv         index membership rows: fecha, indice, activo
+# <directory>/<activo>/fecha.npy      sessions of the instrument (datetime64[D])
+# <directory>/<activo>/<criterio>.npy values aligned with fecha.npy (float64, NaN if missing)
+
+MANIFEST = 'manifest.json'
+DATES = 'fecha'
+MEMBERS = 'grupo.csv'
+
+
+def to_datetime(value):
+    if isinstance(value, np.datetime64):
+        value = value.astype(datetime.date)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    return value
+
+
+def to_datetime64(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def get_signature(cnx):
+    cursor = cnx.cursor()
+    cursor.execute("select max(fecha), count(*) from dato")
+    maxDate, rowCount = cursor.fetchone()
+    cursor.execute("select max(fecha), count(*) from grupo")
+    maxMembers, memberCount = cursor.fetchone()
+    cursor.close()
+    return {
+        'dato': [str(maxDate), rowCount],
+        'grupo': [str(maxMembers), memberCount],
+    }
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fileIn:
+        return json.load(fileIn)
+
+
+def export(config, directory, force=False):
+    """Materializes the dato and grupo tables into a columnar snapshot.
+
+    The snapshot is only rebuilt when max(fecha) or the row count of the tables changed.
+
+    :param config: the MySQL connection parameters.
+    :param directory: the directory to write the snapshot to.
+    :param force: rebuild the snapshot even if it is up to date.
+    :rtype: True if the snapshot was rebuilt.
+    """
+    cnx = mysql.connector.connect(**config)
+    try:
+        signature = get_signature(cnx)
+        manifest = load_manifest(directory)
+        if not force and manifest is not None and manifest['signature'] == signature:
+            return False
+
+        tmpDirectory = directory.rstrip(os.sep) + '.tmp'
+        if os.path.exists(tmpDirectory):
+            shutil.rmtree(tmpDirectory)
+        os.makedirs(tmpDirectory)
+
+        cursor = cnx.cursor()
+        cursor.execute("select distinct(activo) from dato order by activo asc")
+        instruments = [row[0] for row in cursor]
+
+        allDates = set()
+        allFields = set()
+        for instrument in instruments:
+            cursor.execute("select fecha, criterio, valor from dato where activo = %s order by fecha asc", [instrument])
+            dates = []
+            columns = {}
+            for dateTime, criteria, value in cursor:
+                if not dates or dates[-1] != dateTime:
+                    dates.append(dateTime)
+                column = columns.get(criteria)
+                if column is None:
+                    column = {}
+                    columns[criteria] = column
+                column[len(dates) - 1] = float(value)
+
+            instDirectory = os.path.join(tmpDirectory, instrument)
+            os.makedirs(instDirectory)
+            np.save(os.path.join(instDirectory, DATES + '.npy'), np.array([to_datetime64(d) for d in dates], dtype='datetime64[D]'))
+            for criteria, column in columns.items():
+                values = np.full(len(dates), np.nan)
+                values[list(column.keys())] = list(column.values())
+                np.save(os.path.join(instDirectory, criteria + '.npy'), values)
+            allDates.update(dates)
+            allFields.update(columns.keys())
+
+        np.save(os.path.join(tmpDirectory, DATES + '.npy'), np.array(sorted(to_datetime64(d) for d in allDates), dtype='datetime64[D]'))
+
+        cursor.execute("select fecha, indice, activo from grupo order by fecha asc, indice asc")
+        with open(os.path.join(tmpDirectory, MEMBERS), 'w') as fileOut:
+            csvOut = csv.writer(fileOut)
+            for dateTime, index, instrument in cursor:
+                csvOut.writerow([to_datetime(dateTime).strftime("%Y-%m-%d"), index, instrument])
+        cursor.close()
+
+        with open(os.path.join(tmpDirectory, MANIFEST), 'w') as fileOut:
+            json.dump({
+                'signature': signature,
+                'instruments': instruments,
+                'fields': sorted(allFields),
+            }, fileOut, indent=2)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(tmpDirectory, directory)
+        return True
+    finally:
+        cnx.close()
+
+
+class SnapshotDatabase(object):
+    """Drop-in replacement of :class:`pyalgoext.dbfeed.Database` reading from a snapshot
+    written by :func:`export`. Columns are memory-mapped so only the touched pages are read."""
+
+    def __init__(self, directory, fields):
+        for field in dbfeed.DbBar.PRICE_FIELDS:
+            if field and field not in fields:
+                fields.append(field)
+        self.__priceField = dbfeed.DbBar.PRICE_FIELD
+        self.__fields = fields
+        self.__directory = directory
+        self.__dates = {}
+        self.__columns = {}
+        self.__timeline = None
+
+    def start(self):
+        manifest = load_manifest(self.__directory)
+        if manifest is None:
+            raise Exception("No snapshot found at %s" % self.__directory)
+
+        for instrument in manifest['instruments']:
+            instDirectory = os.path.join(self.__directory, instrument)
+            self.__dates[instrument] = np.load(os.path.join(instDirectory, DATES + '.npy'), mmap_mode='r')
+            columns = []
+            for field in self.__fields:
+                path = os.path.join(instDirectory, field + '.npy')
+                columns.append(np.load(path, mmap_mode='r') if os.path.exists(path) else None)
+            self.__columns[instrument] = columns
+
+        with open(os.path.join(self.__directory, MEMBERS)) as fileIn:
+            rows = [(datetime.datetime.strptime(row[0], "%Y-%m-%d"), row[1], row[2]) for row in csv.reader(fileIn)]
+        self.__timeline = membership.MembershipTimeline.fromRows(rows)
+
+    def stop(self):
+        self.__dates = {}
+        self.__columns = {}
+
+    def getFields(self):
+        return self.__fields
+
+    def getTimeline(self):
+        return self.__timeline
+
+    def getMembers(self, index, dateTime):
+        return list(self.__timeline.getMembers(index, dateTime))
+
+    def getDates(self, fromDateTime=None, toDateTime=None):
+        dates = np.load(os.path.join(self.__directory, DATES + '.npy'), mmap_mode='r')
+        start = 0
+        end = len(dates)
+        if fromDateTime:
+            start = np.searchsorted(dates, to_datetime64(fromDateTime), 'left')
+        if toDateTime:
+            end = np.searchsorted(dates, to_datetime64(toDateTime), 'right')
+        return [to_datetime(d) for d in dates[start:end]]
+
+    def __getValues(self, instrument, start, end):
+        columns = self.__columns[instrument]
+        ret = []
+        for pos in range(start, end):
+            values = []
+            for column in columns:
+                value = None
+                if column is not None:
+                    value = float(column[pos])
+                    if value != value:
+                        value = None
+                values.append(value)
+            ret.append(values)
+        return ret
+
+    def getRows(self, instruments, fromDateTime, toDateTime):
+        ret = {}
+        fromDate = to_datetime64(fromDateTime)
+        toDate = to_datetime64(toDateTime)
+        for instrument in instruments:
+            dates = self.__dates.get(instrument)
+            if dates is None:
+                continue
+            start = np.searchsorted(dates, fromDate, 'left')
+            end = np.searchsorted(dates, toDate, 'right')
+            for dateTime, values in zip(dates[start:end], self.__getValues(instrument, start, end)):
+                ret.setdefault(to_datetime(dateTime), {})[instrument] = values
+        return ret
+
+    def getBars(self, instruments, frequency, dateTime):
+        ret = {}
+        date = to_datetime64(dateTime)
+        table = dbfeed.FieldTable.get(self.__fields)
+        pricePos = table.getPosition(self.__priceField)
+        for instrument in instruments:
+            dates = self.__dates.get(instrument)
+            if dates is None:
+                continue
+            pos = np.searchsorted(dates, date, 'left')
+            if pos < len(dates) and dates[pos] == date:
+                values = self.__getValues(instrument, pos, pos + 1)[0]
+                if values[pricePos] is not None:
+                    ret[instrument] = dbfeed.DbBar(dateTime, values, frequency, table)
+        return ret
+
+
+class SnapshotFeed(dbfeed.DbFeed):
+    """A :class:`pyalgoext.dbfeed.DbFeed` that replays bars from a snapshot written by
+    :func:`export` instead of querying MySQL.
+
+    :param directory: the snapshot directory.
+    :param fields: the extra fields (e.g. PER, PBV) to load besides prices.
+    """
+
+    def __init__(self, directory, fields, maxLen=dataseries.DEFAULT_MAX_LEN, startDateTime=None, endDateTime=None):
+        super(SnapshotFeed, self).__init__(directory, fields, maxLen, startDateTime, endDateTime)
+
+    def createDatabase(self, config, fields):
+        return SnapshotDatabase(config, fields)
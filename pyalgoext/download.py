@@ -20,33 +20,252 @@
 """
 
 
-import quandl
+import calendar
+import csv
 import datetime
-import time
-import pandas as pd
+import json
+import os
+import shutil
+import threading
+from multiprocessing import dummy
+
+# The first call to strptime imports this module, which fails when several threads do it at once.
+import _strptime
+
+try:
+    from urllib2 import urlopen
+    from urlparse import urlparse
+except ImportError:
+    from urllib.request import urlopen
+    from urllib.parse import urlparse
+
+
+######################################################################
+## Incremental downloads
+#
+# Every store is a CSV file with the columns:
+# Date,Open,High,Low,Close,Volume,Adj Close
+#
+# Only the sessions after the last date already in the file are requested. The new rows
+# are written to a temporary copy that replaces the file, so an interrupted update
+# leaves the previous file untouched.
+
+HEADER = ["Date", "Open", "High", "Low", "Close", "Volume", "Adj Close"]
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class HttpClient(object):
+    """Fetches URLs with urllib2.
+
+    Any object with a method fetch(url) returning the body as text can be used instead,
+    e.g. a stub in tests. It is called from several threads at once.
+    """
+
+    def __init__(self, timeout=60):
+        self.__timeout = timeout
+
+    def fetch(self, url):
+        response = urlopen(url, timeout=self.__timeout)
+        try:
+            ret = response.read()
+        finally:
+            response.close()
+        if not isinstance(ret, str):
+            ret = ret.decode('utf-8')
+        return ret
+
+
+class HostLimitedClient(object):
+    """Wraps a client so that at most perHost requests to the same host are in flight at a time.
+
+    :param client: the wrapped client, such as a :class:`HttpClient`.
+    :param perHost: the maximum number of concurrent requests per host.
+    """
+
+    def __init__(self, client, perHost=2):
+        self.__client = client
+        self.__perHost = perHost
+        self.__semaphores = {}
+        self.__lock = threading.Lock()
+
+    def __getSemaphore(self, host):
+        with self.__lock:
+            if host not in self.__semaphores:
+                self.__semaphores[host] = threading.Semaphore(self.__perHost)
+            return self.__semaphores[host]
+
+    def fetch(self, url):
+        with self.__getSemaphore(urlparse(url).netloc):
+            return self.__client.fetch(url)
+
+
+class QuandlSource(object):
+    """Daily bars of a Quandl dataset such as BCHARTS/KRAKENUSD, through the CSV API.
+
+    :param apiKey: the Quandl API key, optional for free datasets.
+    """
+
+    URL = "https://www.quandl.com/api/v3/datasets/{}.csv?order=asc&start_date={}"
+
+    def __init__(self, apiKey=None, baseUrl=URL):
+        self.__apiKey = apiKey
+        self.__baseUrl = baseUrl
+
+    def getUrl(self, symbol, startDate, endDate):
+        ret = self.__baseUrl.format(symbol, startDate.strftime(DATE_FORMAT))
+        if endDate is not None:
+            ret += "&end_date=" + endDate.strftime(DATE_FORMAT)
+        if self.__apiKey:
+            ret += "&api_key=" + self.__apiKey
+        return ret
+
+    def parse(self, text):
+        ret = []
+        for row in csv.DictReader(text.splitlines()):
+            # Volume in currency, and no adjustments: the close is the adjusted close.
+            ret.append([row["Date"], row["Open"], row["High"], row["Low"], row["Close"], row["Volume (Currency)"], row["Close"]])
+        return ret
+
+
+class PoloniexSource(object):
+    """Daily bars of a Poloniex currency pair such as BTC_ETH, through the returnChartData API.
+
+    :param period: the candle period in seconds.
+    """
+
+    URL = "https://poloniex.com/public?command=returnChartData&currencyPair={}&start={}&end={}&period={}"
+
+    def __init__(self, period=86400, baseUrl=URL):
+        self.__period = period
+        self.__baseUrl = baseUrl
+
+    def getUrl(self, symbol, startDate, endDate):
+        if endDate is None:
+            endDate = datetime.datetime.utcnow()
+        startTime = calendar.timegm(startDate.timetuple())
+        endTime = calendar.timegm(endDate.timetuple())
+        return self.__baseUrl.format(symbol, startTime, endTime, self.__period)
+
+    def parse(self, text):
+        ret = []
+        for candle in json.loads(text):
+            date = datetime.datetime.utcfromtimestamp(candle["date"]).strftime(DATE_FORMAT)
+            ret.append([date, candle["open"], candle["high"], candle["low"], candle["close"], candle["quoteVolume"], candle["close"]])
+        return ret
+
+
+def get_last_date(store):
+    """Returns the date of the last row of a store, or None if it does not exist or has no rows."""
+    if not os.path.exists(store):
+        return None
+    with open(store, 'rb') as fileIn:
+        fileIn.seek(0, os.SEEK_END)
+        size = fileIn.tell()
+        # The last line is within the last block, a full row is far shorter.
+        fileIn.seek(max(0, size - 4096))
+        lines = [line for line in fileIn.read().decode('utf-8').splitlines() if line.strip()]
+    if not lines or lines[-1].startswith(HEADER[0]):
+        return None
+    return datetime.datetime.strptime(lines[-1].split(",")[0], DATE_FORMAT)
+
+
+def append_rows(store, rows):
+    """Appends rows to a store through a temporary copy, writing the header if the store is new."""
+    tmpStore = store + ".tmp"
+    if os.path.exists(store):
+        shutil.copyfile(store, tmpStore)
+    with open(tmpStore, 'ab') as fileOut:
+        csvOut = csv.writer(fileOut, lineterminator='\n')
+        fileOut.seek(0, os.SEEK_END)
+        if fileOut.tell() == 0:
+            csvOut.writerow(HEADER)
+        csvOut.writerows(rows)
+    if os.name == 'nt' and os.path.exists(store):
+        # os.rename does not replace an existing file on Windows.
+        os.remove(store)
+    os.rename(tmpStore, store)
+
+
+class Download(object):
+    """Brings a store up to date with a source.
+
+    :param source: a :class:`QuandlSource`, :class:`PoloniexSource` or any object with getUrl and parse.
+    :param symbol: the symbol of the source.
+    :param store: the CSV file to update.
+    :param startDate: the first date to download when the store does not exist.
+    :param endDate: the last date to download, None for up to today.
+    """
+
+    def __init__(self, source, symbol, store, startDate=None, endDate=None):
+        self.__source = source
+        self.__symbol = symbol
+        self.__store = store
+        self.__startDate = startDate or datetime.datetime(2010, 1, 1)
+        self.__endDate = endDate
+
+    def getStore(self):
+        return self.__store
+
+    def run(self, client):
+        """Downloads and appends the missing sessions. Returns the number of rows appended."""
+        lastDate = get_last_date(self.__store)
+        startDate = self.__startDate
+        if lastDate is not None:
+            startDate = lastDate + datetime.timedelta(days=1)
+        if self.__endDate is not None and startDate > self.__endDate:
+            return 0
+
+        text = client.fetch(self.__source.getUrl(self.__symbol, startDate, self.__endDate))
+        rows = self.__source.parse(text)
+        if lastDate is not None:
+            lastDay = lastDate.strftime(DATE_FORMAT)
+            rows = [row for row in rows if row[0] > lastDay]
+        rows.sort(key=lambda row: row[0])
+        if rows:
+            append_rows(self.__store, rows)
+        return len(rows)
+
+
+def run(downloads, client=None, concurrency=4, perHost=2):
+    """Runs the downloads in a pool of concurrency threads, with at most perHost requests
+    to the same host at a time.
+
+    :rtype: a dict with the number of rows appended, or the exception raised, of each store.
+    """
+    if client is None:
+        client = HttpClient()
+    client = HostLimitedClient(client, perHost)
+
+    def run_download(download):
+        try:
+            return download.run(client)
+        except Exception as e:
+            return e
+
+    pool = dummy.Pool(max(1, min(concurrency, len(downloads))))
+    try:
+        results = pool.map(run_download, downloads, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return dict((download.getStore(), result) for download, result in zip(downloads, results))
+
+
+def run_one(download, client=None):
+    ret = run([download], client)[download.getStore()]
+    if isinstance(ret, Exception):
+        raise ret
+    return ret
+
 
 def quandl_bitcoin(instrument, store):
-    df = quandl.get(instrument, returns="pandas")
-    df.to_csv(store,
-        columns=["Open", "High", "Low", "Close", "Volume (Currency)", "Close"],
-        header=["Open", "High", "Low", "Close", "Volume", "Adj Close"]
-    )
+    return run_one(Download(QuandlSource(), instrument, store))
+
 
 def poloniex_crypto(poloniex_pair, store, start_date=None, end_date=None):
-    base_polo_url = 'https://poloniex.com/public?command=returnChartData&currencyPair={}&start={}&end={}&period={}'
     if start_date is None:
         start_date = datetime.datetime.strptime('2015-01-01', '%Y-%m-%d')  # get data from the start of 2015
-    if end_date is None:
-        end_date = datetime.datetime.now()  # up until today
-    pediod = 86400  # pull daily data (86,400 seconds per day)
-    start_time = int(time.mktime(start_date.timetuple()))
-    end_time = int(time.mktime(end_date.timetuple()))
-
-    json_url = base_polo_url.format(poloniex_pair, start_time, end_time, pediod)
-    df = pd.read_json(json_url)
-    df = df.set_index('date')
-    df.index.rename("Date", inplace=True)
-    df.to_csv(store,
-        columns=["open", "high", "low", "close", "quoteVolume", "close"],
-        header=["Open", "High", "Low", "Close", "Volume", "Adj Close"]
-    )
+    return run_one(Download(PoloniexSource(), poloniex_pair, store, start_date, end_date))
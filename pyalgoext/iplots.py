@@ -21,8 +21,8 @@
 
 
 from pyalgotrade import plotter
-from plotly.offline import plot as do_plot
-import plotly.tools as tls
+import json
+import math
 import os
 import re
 import webbrowser
@@ -59,6 +59,9 @@ plotter.Subplot.plot = subplot_plot
 plotter.Subplot.getSeries = subplot_getSeries
 
 def plot(fig, resize=True, strip_style=False, strip_notes=False, filename='temp-plot.html', auto_open=True):
+    from plotly.offline import plot as do_plot
+    import plotly.tools as tls
+
     plotly_fig = tls.mpl_to_plotly(fig, resize=resize, strip_style=strip_style)
 
     fl = plotly_fig['layout']
@@ -90,4 +93,167 @@ def augment(filename):
     with open(filename, 'w') as f:
         f.write(text)
     url = 'file://' + os.path.abspath(filename)
-    webbrowser.open(url)
\ No newline at end of file
+    webbrowser.open(url)
+
+######################################################################
+## Direct Plotly builder
+#
+# Instead of drawing a matplotlib figure and converting it with mpl_to_plotly, the
+# series of a StrategyPlotter are read straight into one JSON payload: the sessions
+# once, and for each series its values aligned with them, so dates are not repeated
+# per series. In the page, iplots_0.js draws every line and histogram with at most
+# MAX_POINTS points, keeping the minimum, the maximum and the first gap of each of
+# MAX_POINTS / 3 buckets of sessions, and draws again at full detail as you zoom in.
+# Markers such as buys and sells are few and always drawn in full. The annotation
+# scripts of augment() are inlined.
+
+PLOTLY_JS = "https://cdn.plot.ly/plotly-1.58.5.min.js"
+MAX_POINTS = 2000
+
+COLORS = {'b': 'blue', 'g': 'green', 'r': 'red', 'c': 'cyan', 'm': 'magenta', 'y': 'gold', 'k': 'black', 'w': 'white'}
+SYMBOLS = {'^': 'triangle-up', 'v': 'triangle-down', '<': 'triangle-left', '>': 'triangle-right', 'o': 'circle',
+           's': 'square', 'D': 'diamond', '*': 'star', '+': 'cross', 'x': 'x'}
+
+
+def get_color(color):
+    return COLORS.get(color, color)
+
+
+def format_datetime(dateTime):
+    if dateTime.hour or dateTime.minute or dateTime.second:
+        return dateTime.strftime('%Y-%m-%d %H:%M:%S')
+    return dateTime.strftime('%Y-%m-%d')
+
+
+def round_value(value, precision):
+    # None for missing and non-finite values, which become JSON nulls and line gaps.
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value) or math.isinf(value):
+        return None
+    return float('%.*g' % (precision, value))
+
+
+def get_subplots(strategyPlotter):
+    """Returns the non-empty subplots of a StrategyPlotter, top to bottom as buildFigure draws them."""
+    ret = []
+    ret.extend(strategyPlotter._StrategyPlotter__barSubplots.values())
+    ret.extend(strategyPlotter._StrategyPlotter__namedSubplots.values())
+    if strategyPlotter._StrategyPlotter__portfolioSubplot is not None:
+        ret.append(strategyPlotter._StrategyPlotter__portfolioSubplot)
+    return [subplot for subplot in ret if not subplot.isEmpty()]
+
+
+def build(strategyPlotter, fromDateTime=None, toDateTime=None, precision=8):
+    """Builds the payload of :func:`plot_strategy` from a StrategyPlotter. Must be called after running the strategy.
+
+    :param precision: the significant digits kept of every value.
+    :rtype: a dict with the sessions, the Plotly layout and the traces.
+    """
+    dateTimes = sorted(dateTime for dateTime in strategyPlotter._StrategyPlotter__dateTimes
+                       if (fromDateTime is None or dateTime >= fromDateTime) and (toDateTime is None or dateTime <= toDateTime))
+    positions = dict((dateTime, pos) for pos, dateTime in enumerate(dateTimes))
+
+    subplots = get_subplots(strategyPlotter)
+    count = len(subplots)
+    gap = 0.04 if count > 1 else 0.0
+    height = (1.0 - gap * (count - 1)) / max(count, 1)
+    layout = {
+        'showlegend': True,
+        'legend': {'x': 1.01, 'y': 1, 'borderwidth': 1, 'bgcolor': 'rgb(217,217,217)'},
+        'margin': {'l': 60, 'r': 20, 't': 20, 'b': 40},
+        'xaxis': {'type': 'date', 'hoverformat': '%Y-%m-%d', 'anchor': 'y%d' % count if count > 1 else 'y', 'showgrid': True},
+    }
+
+    traces = []
+    for row, subplot in enumerate(subplots):
+        axis = 'y' if row == 0 else 'y%d' % (row + 1)
+        top = 1.0 - row * (height + gap)
+        layout['yaxis' if row == 0 else 'yaxis%d' % (row + 1)] = {'domain': [max(0.0, top - height), top], 'anchor': 'x', 'showgrid': True}
+
+        nextColor = 0
+        for name, series in subplot._Subplot__series.items():
+            # Same color assignment as plotter.Subplot.
+            color = series.getColor()
+            if color is None:
+                color = plotter.Subplot.colors[nextColor % len(plotter.Subplot.colors)]
+                nextColor += 1
+
+            values = {}
+            for dateTime in series.getValues():
+                pos = positions.get(dateTime)
+                if pos is not None:
+                    value = round_value(series.getValue(dateTime), precision)
+                    if value is not None:
+                        values[pos] = value
+            if not values:
+                continue
+
+            spec = {'name': name, 'xaxis': 'x', 'yaxis': axis}
+            trace = {'spec': spec}
+            if isinstance(series, plotter.HistogramMarker):
+                spec.update({'type': 'bar', 'marker': {'color': get_color(color)}})
+                trace['y'] = [values.get(pos) for pos in range(len(dateTimes))]
+                colors = [get_color(series.getColorForValue(value, color)) if value is not None else None for value in trace['y']]
+                if any(itemColor != get_color(color) for itemColor in colors if itemColor is not None):
+                    trace['c'] = colors
+            elif series.getMarker().strip():
+                # Markers are sparse, they are sent as (position, value) pairs and never decimated.
+                spec.update({'type': 'scatter', 'mode': 'markers', 'marker': {'color': get_color(color), 'symbol': SYMBOLS.get(series.getMarker(), 'circle'), 'size': 9}})
+                trace['i'] = sorted(values.keys())
+                trace['y'] = [values[pos] for pos in trace['i']]
+            else:
+                spec.update({'type': 'scatter', 'mode': 'lines', 'line': {'color': get_color(color), 'width': 1.5}})
+                trace['y'] = [values.get(pos) for pos in range(len(dateTimes))]
+            traces.append(trace)
+
+    return {
+        'x': [format_datetime(dateTime) for dateTime in dateTimes],
+        'layout': layout,
+        'traces': traces,
+    }
+
+
+def render(payload, filename='temp-plot.html', plotlyjs=PLOTLY_JS, maxPoints=MAX_POINTS, augmented=True, auto_open=True):
+    """Writes the payload of :func:`build` as a standalone HTML page.
+
+    :param plotlyjs: the URL of plotly.js, or 'inline' to embed the one of the plotly package for offline use.
+    :param maxPoints: the maximum number of points drawn of every line or histogram at any zoom level, at least 3.
+    :param augmented: True to inline the annotation tools of :func:`augment`.
+    """
+    dir = os.path.dirname(__file__)
+    with open(dir + "/iplots_0.js", "r") as f:
+        script_0 = f.read()
+    config = '{showLink:!1,displaylogo:!1}'
+    script_2 = ""
+    if augmented:
+        with open(dir + "/iplots_1.js", "r") as f:
+            config = f.read()
+        with open(dir + "/iplots_2.js", "r") as f:
+            script_2 = f.read()
+
+    plotId = "iplot"
+    if plotlyjs == 'inline':
+        from plotly.offline import get_plotlyjs
+        library = '<script type="text/javascript">%s</script>' % get_plotlyjs()
+    else:
+        library = '<script type="text/javascript" src="%s"></script>' % plotlyjs
+    text = script_0.replace("[PLOTID]", plotId).replace("[MAXPOINTS]", str(max(3, int(maxPoints)))).replace("[CONFIG]", config)
+    text = text.replace("[PAYLOAD]", json.dumps(payload, separators=(',', ':')))
+
+    with open(filename, 'w') as f:
+        f.write('<html><head><meta charset="utf-8" />%s</head><body>' % library)
+        f.write('<div id="%s" style="height:100%%;width:100%%;"></div>' % plotId)
+        f.write('<script type="text/javascript">%s</script>' % text)
+        if script_2:
+            f.write('<script type="text/javascript">%s</script>' % script_2.replace("[PLOTID]", plotId))
+        f.write('</body></html>')
+
+    if auto_open:
+        webbrowser.open('file://' + os.path.abspath(filename))
+
+
+def plot_strategy(strategyPlotter, filename='temp-plot.html', auto_open=True, fromDateTime=None, toDateTime=None, maxPoints=MAX_POINTS, plotlyjs=PLOTLY_JS, augmented=True):
+    """Plots a StrategyPlotter as an interactive Plotly page, in place of plot(strategyPlotter.buildFigure()) and augment()."""
+    render(build(strategyPlotter, fromDateTime, toDateTime), filename, plotlyjs, maxPoints, augmented, auto_open)
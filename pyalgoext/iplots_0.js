@@ -0,0 +1 @@
+var payload=[PAYLOAD];var X=payload.x;var maxPoints=[MAXPOINTS];function lowerBound(v){var lo=0,hi=X.length;while(lo<hi){var mid=(lo+hi)>>1;if(X[mid]<v){lo=mid+1}else{hi=mid}};return lo};function decimate(y,i0,i1){var ret=[];var buckets=Math.max(1,Math.floor(maxPoints/3));if(i1-i0<=maxPoints){for(var i=i0;i<i1;i++){ret.push(i)};return ret};var size=(i1-i0)/buckets;for(var b=0;b<buckets;b++){var s=i0+Math.floor(b*size),e=i0+Math.floor((b+1)*size),mn=-1,mx=-1,gap=-1;for(var i=s;i<e;i++){var v=y[i];if(v===null){if(gap<0){gap=i};continue};if(mn<0||v<y[mn]){mn=i};if(mx<0||v>y[mx]){mx=i}};var keep=[mn,mx,gap].filter(function(i,pos,all){return i>=0&&all.indexOf(i)==pos});keep.sort(function(a,b){return a-b});ret.push.apply(ret,keep)};return ret};function traceData(t,i0,i1){var idx=t.i?t.i:decimate(t.y,i0,i1);var pos=t.i?function(k){return k}:function(k){return idx[k]};var x=[],y=[],c=[];for(var k=0;k<idx.length;k++){x.push(X[idx[k]]);y.push(t.i?t.y[k]:t.y[pos(k)]);if(t.c){c.push(t.c[pos(k)])}};return{x:x,y:y,c:t.c?c:null}};function buildData(i0,i1){return payload.traces.map(function(t){var d=traceData(t,i0,i1);var ret=JSON.parse(JSON.stringify(t.spec));ret.x=d.x;ret.y=d.y;if(d.c){ret.marker.color=d.c};return ret})};function redraw(i0,i1){var xs=[],ys=[],cs=[],ids=[];payload.traces.forEach(function(t,n){if(t.i){return};var d=traceData(t,i0,i1);xs.push(d.x);ys.push(d.y);cs.push(d.c?d.c:t.spec.marker?t.spec.marker.color:t.spec.line.color);ids.push(n)});if(ids.length){Plotly.restyle('[PLOTID]',{x:xs,y:ys,'marker.color':cs},ids)}};Plotly.newPlot('[PLOTID]',buildData(0,X.length),payload.layout,[CONFIG]);document.getElementById('[PLOTID]').on('plotly_relayout',function(ev){var r=ev['xaxis.range'];var r0=r?r[0]:ev['xaxis.range[0]'],r1=r?r[1]:ev['xaxis.range[1]'];if(r0!==undefined){redraw(Math.max(0,lowerBound(String(r0))-1),Math.min(X.length,lowerBound(String(r1))+1))}else if(ev['xaxis.autorange']){redraw(0,X.length)}});
@@ -0,0 +1,124 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import bisect
+import csv
+import datetime
+
+
+def to_datetime(value):
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    return value
+
+
+class MembershipTimeline(object):
+    """Index membership as a list of change points per index.
+    Each change point holds the full list of members from that date on,
+    so the members at any date are found with a binary search.
+    """
+
+    def __init__(self):
+        self.__dates = {}
+        self.__members = {}
+
+    def addMembers(self, index, dateTime, members):
+        """Sets the members of the index from dateTime on."""
+        dateTime = to_datetime(dateTime)
+        dates = self.__dates.setdefault(index, [])
+        changes = self.__members.setdefault(index, [])
+        pos = bisect.bisect_left(dates, dateTime)
+        if pos < len(dates) and dates[pos] == dateTime:
+            changes[pos] = list(members)
+        else:
+            dates.insert(pos, dateTime)
+            changes.insert(pos, list(members))
+
+    def getIndices(self):
+        return list(self.__dates.keys())
+
+    def getChangeDates(self, index):
+        return self.__dates.get(index, [])
+
+    def getPosition(self, index, dateTime):
+        """Returns the change point in effect at dateTime, or -1 if the index had no members yet."""
+        dates = self.__dates.get(index)
+        if not dates:
+            return -1
+        return bisect.bisect_right(dates, to_datetime(dateTime)) - 1
+
+    def getMembersAt(self, index, position):
+        if position < 0:
+            return []
+        return self.__members[index][position]
+
+    def getMembers(self, index, dateTime):
+        """Returns the members of the index at dateTime. The list is shared, do not modify it."""
+        return self.getMembersAt(index, self.getPosition(index, dateTime))
+
+    def isMember(self, index, instrument, dateTime):
+        return instrument in self.getMembers(index, dateTime)
+
+    @classmethod
+    def fromRows(cls, rows):
+        """Builds the timeline from (fecha, indice, activo) rows like the ones in the grupo table."""
+        changes = {}
+        for dateTime, index, instrument in rows:
+            changes.setdefault(index, {}).setdefault(to_datetime(dateTime), []).append(instrument)
+        ret = cls()
+        for index, members in changes.items():
+            for dateTime, instruments in members.items():
+                ret.addMembers(index, dateTime, instruments)
+        return ret
+
+    @classmethod
+    def fromDatabase(cls, connection):
+        """Loads every change of the grupo table with a single query."""
+        cursor = connection.cursor()
+        cursor.execute("select fecha, indice, activo from grupo order by fecha asc, indice asc")
+        ret = cls.fromRows(cursor)
+        cursor.close()
+        return ret
+
+    @classmethod
+    def fromCsv(cls, idxCsv, index, verbose=True):
+        """Loads a Date,Inclusions,Exclusions file like IBEX-components.csv."""
+        ret = cls()
+        with open(idxCsv, "rU") as fileIn:
+            csvIn = csv.reader(fileIn)
+            next(csvIn)
+            idxList = []
+            for row in csvIn:
+                evtDateTime = datetime.datetime.strptime(row[0], "%Y-%m-%d")
+                for symbol in row[1].split():
+                    if symbol in idxList:
+                        if verbose:
+                            print("%s - symbol %s already in index" % (evtDateTime, symbol))
+                    else:
+                        idxList.append(symbol)
+                for symbol in row[2].split():
+                    if symbol in idxList:
+                        idxList.remove(symbol)
+                    elif verbose:
+                        print("%s - symbol %s not in index" % (evtDateTime, symbol))
+                ret.addMembers(index, evtDateTime, idxList)
+        return ret
@@ -0,0 +1,71 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+from pyalgotrade import dispatcher
+
+
+######################################################################
+## Several strategies in one pass over a feed
+#
+# Every strategy and its backtesting broker subscribe to the new values event of the
+# feed when they are built, so a single dispatcher over the shared feed drives all of
+# them: each bar is read once and handed to broker 1, strategy 1, broker 2, strategy 2...
+# in the order they were built. Each strategy still sees its own broker fill orders
+# before its onBars, exactly as when it runs alone.
+
+
+def run(strategies):
+    """Runs several strategies built on the same feed, in place of calling run() on each one
+    and resetting the feed in between. Brokers must be independent, strategies must not
+    trade through each other's broker.
+
+    Like :meth:`pyalgotrade.strategy.BaseStrategy.run`, each strategy can only be run once.
+
+    :param strategies: a list of :class:`pyalgotrade.strategy.BacktestingStrategy` sharing their feed.
+    """
+    if not strategies:
+        return
+
+    barFeed = strategies[0].getFeed()
+    brokers = set()
+    for strat in strategies:
+        if strat.getFeed() is not barFeed:
+            raise Exception("All the strategies must share the same feed")
+        if strat.getBroker() in brokers:
+            raise Exception("All the strategies must have their own broker")
+        brokers.add(strat.getBroker())
+
+    multiDispatcher = dispatcher.Dispatcher()
+    for strat in strategies:
+        stratDispatcher = strat.getDispatcher()
+        # The feed, the broker and any resampled feeds of the strategy. The shared feed is only added once.
+        for subject in stratDispatcher.getSubjects():
+            multiDispatcher.addSubject(subject)
+        multiDispatcher.getStartEvent().subscribe(strat.onStart)
+        multiDispatcher.getIdleEvent().subscribe(stratDispatcher.getIdleEvent().emit)
+    multiDispatcher.run()
+
+    bars = barFeed.getCurrentBars()
+    if bars is None:
+        raise Exception("Feed was empty")
+    for strat in strategies:
+        strat.onFinish(bars)
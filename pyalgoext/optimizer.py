@@ -0,0 +1,551 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import collections
+import csv
+import itertools
+import logging
+import math
+import multiprocessing
+import random
+import time
+
+import numpy as np
+from pyalgotrade import bar
+from pyalgotrade import barfeed
+from pyalgotrade import feed as basefeed
+from pyalgotrade import logger
+from pyalgotrade import strategy
+from pyalgotrade import stratanalyzer
+
+
+class BarStore(object):
+    """Bars of a feed held as one float64 matrix per instrument, loaded once
+    and inherited by the worker processes instead of being re-read by each of them.
+
+    Columns are open, high, low, close, volume and adjusted close, NaN when the
+    instrument has no bar for the session.
+    """
+
+    COLUMNS = 6
+
+    def __init__(self, frequency, instruments, dateTimes, values):
+        self.__frequency = frequency
+        self.__instruments = instruments
+        self.__dateTimes = dateTimes
+        self.__values = values
+
+    @classmethod
+    def fromFeed(cls, barFeed):
+        instruments = []
+        dateTimes = []
+        rows = {}
+        for dateTime, bars in basefeed.feed_iterator(barFeed):
+            pos = len(dateTimes)
+            dateTimes.append(dateTime)
+            for instrument in bars.getInstruments():
+                if instrument not in rows:
+                    instruments.append(instrument)
+                    rows[instrument] = {}
+                aBar = bars[instrument]
+                rows[instrument][pos] = (aBar.getOpen(), aBar.getHigh(), aBar.getLow(), aBar.getClose(), aBar.getVolume(), aBar.getAdjClose())
+
+        # Bars list their instruments in the order the feed registered them, as the feed does.
+        registered = [instrument for instrument in barFeed.getRegisteredInstruments() if instrument in rows]
+        instruments = registered + [instrument for instrument in instruments if instrument not in registered]
+
+        values = {}
+        for instrument in instruments:
+            matrix = np.full((len(dateTimes), cls.COLUMNS), np.nan)
+            for pos, row in rows[instrument].items():
+                matrix[pos] = row
+            values[instrument] = matrix
+        return cls(barFeed.getFrequency(), instruments, dateTimes, values)
+
+    def getFrequency(self):
+        return self.__frequency
+
+    def getInstruments(self):
+        return self.__instruments
+
+    def getDateTimes(self):
+        return self.__dateTimes
+
+    def getValues(self, instrument):
+        return self.__values[instrument]
+
+    def getBars(self, start=0, end=None):
+        """Builds the :class:`pyalgotrade.bar.Bars` of the sessions in [start, end)."""
+        if end is None:
+            end = len(self.__dateTimes)
+        ret = []
+        for pos in range(start, end):
+            dateTime = self.__dateTimes[pos]
+            bars = {}
+            for instrument in self.__instruments:
+                row = self.__values[instrument][pos]
+                if not np.isnan(row[3]):
+                    bars[instrument] = bar.BasicBar(dateTime, row[0], row[1], row[2], row[3], row[4], row[5], self.__frequency)
+            if bars:
+                ret.append(bar.Bars(bars))
+        return ret
+
+    def getFeed(self, bars=None):
+        if bars is None:
+            bars = self.getBars()
+        return barfeed.OptimizerBarFeed(self.__frequency, self.__instruments, bars)
+
+
+# Worker state, inherited on fork or set once per worker by the initializer.
+_worker = {}
+
+
+def _init_worker(strategyClass, store, logLevel):
+    logger.getLogger(strategy.BaseStrategy.LOGGER_NAME).setLevel(logLevel)
+    _worker['strategyClass'] = strategyClass
+    _worker['store'] = store
+    _worker['bars'] = store.getBars()
+
+
+def run_parameters(strategyClass, store, bars, parameters):
+    strat = strategyClass(store.getFeed(bars), *parameters)
+    strat.run()
+    return strat.getResult()
+
+
+class EquityCurve(stratanalyzer.StrategyAnalyzer):
+    """Records the equity of the broker once per session: the first value is the initial
+    equity and value i + 1 the equity at the close of session i, so the return over the
+    sessions in [start, end) is values[end] / values[start] - 1."""
+
+    def __init__(self):
+        super(EquityCurve, self).__init__()
+        self.__broker = None
+        self.__values = []
+
+    def attached(self, strat):
+        self.__broker = strat.getBroker()
+        self.__values.append(self.__broker.getEquity())
+
+    def beforeOnBars(self, strat, bars):
+        self.__values.append(self.__broker.getEquity())
+
+    def getValues(self):
+        return np.array(self.__values)
+
+
+def run_equity_curve(strategyClass, store, bars, parameters):
+    """Like :func:`run_parameters`, but returns a (result, equity) tuple with the values of an :class:`EquityCurve`."""
+    strat = strategyClass(store.getFeed(bars), *parameters)
+    curve = EquityCurve()
+    strat.attachAnalyzer(curve)
+    strat.run()
+    return strat.getResult(), curve.getValues()
+
+
+def _run_chunk(job):
+    sessions, chunk = job
+    # Successive halving evaluates on a prefix of the history.
+    bars = _worker['bars'] if sessions is None else _worker['bars'][:sessions]
+    ret = []
+    for parameters in chunk:
+        result = None
+        try:
+            result = run_parameters(_worker['strategyClass'], _worker['store'], bars, parameters)
+        except Exception as e:
+            logger.getLogger("optimizer").error("Error running %s: %s" % (parameters, e))
+        ret.append((parameters, result))
+    return ret
+
+
+def get_chunks(strategyParameters, chunkSize):
+    iterator = iter(strategyParameters)
+    while True:
+        chunk = list(itertools.islice(iterator, chunkSize))
+        if not chunk:
+            break
+        yield chunk
+
+
+class Budget(object):
+    """Limits an optimization by number of evaluations and/or wall-clock seconds.
+
+    :param maxEvaluations: the maximum number of strategy runs, or None.
+    :param maxSeconds: the maximum elapsed time in seconds, or None.
+    """
+
+    def __init__(self, maxEvaluations=None, maxSeconds=None):
+        self.__maxEvaluations = maxEvaluations
+        self.__maxSeconds = maxSeconds
+        self.__evaluations = 0
+        self.__startTime = time.time()
+
+    def spend(self, evaluations):
+        self.__evaluations += evaluations
+
+    def getEvaluations(self):
+        return self.__evaluations
+
+    def getRemainingEvaluations(self):
+        if self.__maxEvaluations is None:
+            return None
+        return max(0, self.__maxEvaluations - self.__evaluations)
+
+    def exhausted(self):
+        if self.__maxEvaluations is not None and self.__evaluations >= self.__maxEvaluations:
+            return True
+        if self.__maxSeconds is not None and time.time() - self.__startTime >= self.__maxSeconds:
+            return True
+        return False
+
+
+class SearchSpace(object):
+    """Ordered description of the values each strategy parameter can take.
+
+    :param dimensions: a list of (name, values) tuples, in the order the strategy expects them.
+    """
+
+    def __init__(self, dimensions):
+        self.__names = [name for name, values in dimensions]
+        self.__values = [list(values) for name, values in dimensions]
+
+    def getNames(self):
+        return self.__names
+
+    def getSize(self):
+        ret = 1
+        for values in self.__values:
+            ret *= len(values)
+        return ret
+
+    def grid(self):
+        return itertools.product(*self.__values)
+
+    def random(self, count, seed=None):
+        """Yields count distinct parameter tuples picked uniformly at random."""
+        rnd = random.Random(seed)
+        count = min(count, self.getSize())
+        seen = set()
+        while len(seen) < count:
+            parameters = tuple(rnd.choice(values) for values in self.__values)
+            if parameters not in seen:
+                seen.add(parameters)
+                yield parameters
+
+    def latinHypercube(self, count, seed=None):
+        """Yields count parameter tuples so that every dimension is evenly covered."""
+        rnd = random.Random(seed)
+        columns = []
+        for values in self.__values:
+            strata = list(range(count))
+            rnd.shuffle(strata)
+            columns.append([values[int((stratum + rnd.random()) / count * len(values))] for stratum in strata])
+        for i in range(count):
+            yield tuple(column[i] for column in columns)
+
+
+class ResultsWriter(object):
+    """Appends parameters,result rows to a CSV file as they arrive and tracks the best result."""
+
+    def __init__(self, resultsFile=None):
+        self.__file = open(resultsFile, "w") if resultsFile else None
+        self.__csv = csv.writer(self.__file) if self.__file else None
+        self.__bestParameters = None
+        self.__bestResult = None
+        self.__count = 0
+
+    def write(self, results, prefix=None):
+        prefix = prefix or []
+        for parameters, result in results:
+            self.__count += 1
+            if self.__csv:
+                self.__csv.writerow(prefix + list(parameters) + [result])
+            if result is not None and (self.__bestResult is None or result > self.__bestResult):
+                self.__bestResult = result
+                self.__bestParameters = parameters
+        if self.__file:
+            self.__file.flush()
+
+    def close(self):
+        if self.__file:
+            self.__file.close()
+
+    def getBest(self):
+        return self.__bestParameters, self.__bestResult
+
+    def getCount(self):
+        return self.__count
+
+
+def _evaluate(pool, workerCount, strategyParameters, chunkSize, sessions, budget, onResults, function=_run_chunk):
+    # Bounded number of chunks in flight so huge grids are never fully materialized.
+    # Every job is (sessions, chunk), sessions being whatever the function expects first.
+    pending = collections.deque()
+    for chunk in get_chunks(strategyParameters, chunkSize):
+        if budget.exhausted():
+            break
+        remaining = budget.getRemainingEvaluations()
+        if remaining is not None:
+            chunk = chunk[:remaining]
+        budget.spend(len(chunk))
+        pending.append(pool.apply_async(function, ((sessions, chunk),)))
+        if len(pending) >= workerCount * 2:
+            onResults(pending.popleft().get())
+    while pending:
+        onResults(pending.popleft().get())
+
+
+def _start(strategyClass, barFeed, workerCount, logLevel):
+    store = barFeed if isinstance(barFeed, BarStore) else BarStore.fromFeed(barFeed)
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+    logger.getLogger("optimizer").info("Loaded %d sessions of %s" % (len(store.getDateTimes()), ", ".join(store.getInstruments())))
+    pool = multiprocessing.Pool(workerCount, _init_worker, (strategyClass, store, logLevel))
+    return store, workerCount, pool
+
+
+def run(strategyClass, barFeed, strategyParameters, workerCount=None, chunkSize=50, resultsFile=None, logLevel=logging.ERROR, maxEvaluations=None, maxSeconds=None):
+    """Executes many instances of a strategy in parallel and finds the parameters that yield the best results.
+
+    Unlike :func:`pyalgotrade.optimizer.local.run` the feed is read once into a :class:`BarStore`
+    shared with the workers, and parameters are sent in chunks.
+
+    :param strategyClass: the strategy class, built as strategyClass(feed, *parameters).
+    :param barFeed: the feed to run the strategies with, or a :class:`BarStore`.
+    :param strategyParameters: an iterable of parameter tuples, consumed lazily (e.g. from a :class:`SearchSpace`).
+    :param workerCount: the number of worker processes, by default the number of CPUs.
+    :param chunkSize: the number of parameter tuples sent to a worker at a time.
+    :param resultsFile: optional CSV file where the results are written as they finish.
+    :param logLevel: the log level of the strategies inside the workers.
+    :param maxEvaluations: stop after this many strategy runs.
+    :param maxSeconds: stop submitting new runs after this many seconds.
+    :rtype: a (parameters, result) tuple with the best result.
+    """
+    store, workerCount, pool = _start(strategyClass, barFeed, workerCount, logLevel)
+    budget = Budget(maxEvaluations, maxSeconds)
+    writer = ResultsWriter(resultsFile)
+    try:
+        _evaluate(pool, workerCount, strategyParameters, chunkSize, None, budget, writer.write)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+
+    bestParameters, bestResult = writer.getBest()
+    logger.getLogger("optimizer").info("Best final result %s with parameters %s out of %d runs" % (bestResult, bestParameters, writer.getCount()))
+    return bestParameters, bestResult
+
+
+def run_halving(strategyClass, barFeed, strategyParameters, eta=3, minSessions=250, workerCount=None, chunkSize=10, resultsFile=None, logLevel=logging.ERROR, maxEvaluations=None, maxSeconds=None):
+    """Successive halving: every candidate is run on a short prefix of the history, only the
+    best 1/eta go on to a prefix eta times longer, until the survivors run on the whole history.
+
+    Rows of the results file are prefixed with the number of sessions of the round.
+
+    :param strategyParameters: the candidate parameter tuples, e.g. :meth:`SearchSpace.latinHypercube`.
+    :param eta: the ratio of candidates discarded and of history added in each round.
+    :param minSessions: the minimum number of sessions of the first round.
+    :rtype: a (parameters, result) tuple with the best result of the last round run. That is a result on the
+        whole history, unless maxEvaluations or maxSeconds run out before the last round: then it is the best
+        of the candidates run in the round cut short, scored on the shorter prefix of that round, whose
+        number of sessions is logged and prefixes its rows in the results file.
+
+    See :func:`run` for the rest of the parameters.
+    """
+    candidates = list(strategyParameters)
+    store, workerCount, pool = _start(strategyClass, barFeed, workerCount, logLevel)
+    total = len(store.getDateTimes())
+    rounds = 1
+    while eta ** rounds <= len(candidates) and total // (eta ** rounds) >= minSessions:
+        rounds += 1
+
+    log = logger.getLogger("optimizer")
+    budget = Budget(maxEvaluations, maxSeconds)
+    writer = ResultsWriter(resultsFile)
+    best = (None, None)
+    try:
+        for step in range(rounds):
+            sessions = total // (eta ** (rounds - 1 - step))
+            results = []
+
+            def onResults(chunkResults):
+                results.extend(chunkResults)
+                writer.write(chunkResults, [sessions])
+
+            _evaluate(pool, workerCount, candidates, chunkSize, sessions, budget, onResults)
+            results = sorted([item for item in results if item[1] is not None], key=lambda item: item[1], reverse=True)
+            log.info("Round %d: %d candidates on %d sessions" % (step + 1, len(results), sessions))
+            if not results:
+                break
+            best = results[0]
+            if budget.exhausted():
+                break
+            candidates = [parameters for parameters, result in results[:max(1, int(math.ceil(len(results) / float(eta))))]]
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+
+    log.info("Best final result %s with parameters %s after %d runs" % (best[1], best[0], budget.getEvaluations()))
+    return best
+
+
+######################################################################
+## Walk-forward optimization
+#
+# The history is split in folds: the parameters are chosen on a train window and
+# then traded on the test window that follows it. Instead of optimizing again for
+# every fold, every parameter tuple is run once over the whole history recording its
+# equity per session, and each fold is scored from the slices of those curves. The
+# whole walk-forward costs one full optimization, plus one more run per parameter
+# tuple picked, to stitch the test windows into one out-of-sample equity curve.
+#
+# As every run is continuous, indicators, stops and positions are already warmed up
+# by the earlier sessions when a window starts, and the test window of a fold is what
+# the chosen parameters would have earned had they been traded all along.
+
+
+def walk_forward_folds(sessions, trainSessions, testSessions, anchored=False):
+    """Returns the (trainStart, testStart, testEnd) session ranges of the folds: train on [trainStart, testStart)
+    and test on [testStart, testEnd), one test window after the other until the last session, the last one
+    possibly shorter.
+
+    :param sessions: the number of sessions of the history.
+    :param trainSessions: the number of sessions of every train window.
+    :param testSessions: the number of sessions of every test window.
+    :param anchored: if True every train window starts at the first session and grows fold after fold.
+    """
+    ret = []
+    testStart = trainSessions
+    while testStart < sessions:
+        testEnd = min(testStart + testSessions, sessions)
+        trainStart = 0 if anchored else testStart - trainSessions
+        ret.append((trainStart, testStart, testEnd))
+        testStart = testEnd
+    return ret
+
+
+def total_return(equity):
+    """The default walk-forward score: the return of an equity curve slice."""
+    return float(equity[-1] / equity[0] - 1)
+
+
+def _run_walk_forward_chunk(job):
+    (folds, score), chunk = job
+    ret = []
+    for parameters in chunk:
+        result = None
+        trainScores = testReturns = [None] * len(folds)
+        try:
+            result, equity = run_equity_curve(_worker['strategyClass'], _worker['store'], _worker['bars'], parameters)
+            trainScores = [score(equity[trainStart:testStart + 1]) for trainStart, testStart, testEnd in folds]
+            testReturns = [total_return(equity[testStart:testEnd + 1]) for trainStart, testStart, testEnd in folds]
+        except Exception as e:
+            logger.getLogger("optimizer").error("Error running %s: %s" % (parameters, e))
+        ret.append((parameters, result, trainScores, testReturns))
+    return ret
+
+
+def _run_equity_curve(parameters):
+    return run_equity_curve(_worker['strategyClass'], _worker['store'], _worker['bars'], parameters)[1]
+
+
+def run_walk_forward(strategyClass, barFeed, strategyParameters, trainSessions, testSessions, anchored=False, score=total_return, workerCount=None, chunkSize=50, resultsFile=None, logLevel=logging.ERROR, maxEvaluations=None, maxSeconds=None):
+    """Walk-forward optimization: picks the best parameters on every train window of :func:`walk_forward_folds`
+    and stitches their test windows into one out-of-sample equity curve.
+
+    Rows of the results file are the train start, test start and test end dates of a fold, the parameters
+    picked, their train score and their test return.
+
+    :param trainSessions: the number of sessions of every train window, at least one.
+    :param testSessions: the number of sessions of every test window.
+    :param anchored: if True every train window starts at the first session.
+    :param score: a module level function that scores the equity slice of a train window, higher is better.
+        Defaults to :func:`total_return`.
+    :rtype: a (folds, equity) tuple. folds is a list of (trainFrom, testFrom, testTo, parameters, trainScore, testReturn)
+        tuples, testTo excluded, parameters None if no run succeeded. equity is a list of (dateTime, equity) tuples,
+        from the initial equity at the close of the last session before the first test window to the last session.
+
+    See :func:`run` for the rest of the parameters.
+    """
+    store, workerCount, pool = _start(strategyClass, barFeed, workerCount, logLevel)
+    dateTimes = store.getDateTimes()
+    folds = walk_forward_folds(len(dateTimes), trainSessions, testSessions, anchored)
+    if not folds:
+        pool.terminate()
+        pool.join()
+        raise Exception("Not enough sessions for a train window of %d sessions" % trainSessions)
+
+    log = logger.getLogger("optimizer")
+    budget = Budget(maxEvaluations, maxSeconds)
+    best = [(None, None, None)] * len(folds)
+    curves = {}
+
+    def onResults(chunkResults):
+        for parameters, result, trainScores, testReturns in chunkResults:
+            for pos, (trainScore, testReturn) in enumerate(zip(trainScores, testReturns)):
+                if trainScore is not None and (best[pos][1] is None or trainScore > best[pos][1]):
+                    best[pos] = (parameters, trainScore, testReturn)
+
+    try:
+        _evaluate(pool, workerCount, strategyParameters, chunkSize, (folds, score), budget, onResults, _run_walk_forward_chunk)
+        # Only the curves of the parameters picked are needed in full.
+        picked = list(set(parameters for parameters, trainScore, testReturn in best if parameters is not None))
+        curves = dict(zip(picked, pool.map(_run_equity_curve, picked, 1)))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    ret = []
+    equity = []
+    # Every run starts with the same equity, and so does the stitched curve.
+    value = float(list(curves.values())[0][0]) if curves else None
+    equity.append((dateTimes[folds[0][1] - 1], value))
+    for (trainStart, testStart, testEnd), (parameters, trainScore, testReturn) in zip(folds, best):
+        curve = curves.get(parameters)
+        for pos in range(testStart, testEnd):
+            # Out of the market when no run succeeded.
+            if curve is not None:
+                value *= float(curve[pos + 1] / curve[pos])
+            equity.append((dateTimes[pos], value))
+        testTo = dateTimes[testEnd] if testEnd < len(dateTimes) else None
+        ret.append((dateTimes[trainStart], dateTimes[testStart], testTo, parameters, trainScore, testReturn))
+        log.info("Fold %s - %s: parameters %s, train score %s, test return %s" % (dateTimes[testStart], dateTimes[testEnd - 1], parameters, trainScore, testReturn))
+
+    if resultsFile:
+        with open(resultsFile, "w") as f:
+            csvWriter = csv.writer(f)
+            for trainFrom, testFrom, testTo, parameters, trainScore, testReturn in ret:
+                csvWriter.writerow([trainFrom, testFrom, testTo] + list(parameters or []) + [trainScore, testReturn])
+
+    if value is not None:
+        log.info("Out-of-sample return %s over %d folds after %d runs" % (equity[-1][1] / equity[0][1] - 1, len(folds), budget.getEvaluations() + len(curves)))
+    return ret, equity
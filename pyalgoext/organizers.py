@@ -21,9 +21,15 @@
 
 
 import math
+import numpy as np
 from pyalgotrade import dataseries
 
 
+def _same_values(previous, current):
+    # Like np.array_equal with equal_nan, which needs numpy 1.19.
+    return previous.shape == current.shape and ((previous == current) | (np.isnan(previous) & np.isnan(current))).all()
+
+
 class OrganizerWindow(object):
     def __init__(self, windowSize, dtype=float, skipNone=True):
         assert(windowSize > 0)
@@ -89,55 +95,89 @@ class OrderRule(object):
         return self.__weight
 
 
+class RankingEngine(object):
+    """Ranks the members by the weighted sum of their rank on each :class:`OrderRule`.
+
+    Values are kept in one NumPy array per concept, indexed by member, and ranked with a single sort.
+    A rule is only ranked again when the members or the values of its concept changed since the last call.
+
+    Ties share the lowest rank and None values count towards the ranks but score nothing,
+    as in the original per-rule sorts.
+
+    :param rules: the list of :class:`OrderRule`.
+    :param groups: the number of groups to bucket the ranks of each rule into, or None.
+    """
+
+    def __init__(self, rules, groups=None):
+        self.__rules = rules
+        self.__groups = groups
+        self.__concepts = []
+        for rule in rules:
+            if rule.getConcept() not in self.__concepts:
+                self.__concepts.append(rule.getConcept())
+        self.__members = None
+        self.__values = {}
+        self.__scores = [None] * len(rules)
+
+    def __getValues(self, members, bars):
+        ret = dict((concept, np.full(len(members), np.nan)) for concept in self.__concepts)
+        for pos, instrument in enumerate(members):
+            if instrument in bars:
+                bar = bars[instrument]
+                for concept in self.__concepts:
+                    value = bar.getField(concept)
+                    if value is not None:
+                        ret[concept][pos] = float(value)
+        return ret
+
+    def __getScore(self, rule, values, ratio):
+        valid = ~np.isnan(values)
+        ordered = np.sort(values[valid])
+        nones = len(values) - len(ordered)
+        # Rank 1 is the worst: Nones first, then the values from worst to best.
+        if rule.isAsc():
+            better = len(ordered) - np.searchsorted(ordered, values[valid], 'right')
+        else:
+            better = np.searchsorted(ordered, values[valid], 'left')
+        ret = np.zeros(len(values))
+        ret[valid] = np.ceil((nones + better + 1) / float(ratio)) * rule.getWeight()
+        return ret
+
+    def rank(self, members, bars):
+        """Returns the list of (instrument, score) tuples of the members, from the highest score to the lowest."""
+        members = list(members)
+        changedMembers = members != self.__members
+        self.__members = members
+
+        ratio = 1
+        if self.__groups:
+            ratio = len(members) / float(self.__groups)
+
+        values = self.__getValues(members, bars)
+        changed = {}
+        for concept in self.__concepts:
+            previous = self.__values.get(concept)
+            changed[concept] = changedMembers or previous is None or not _same_values(previous, values[concept])
+        self.__values = values
+
+        total = np.zeros(len(members))
+        for pos, rule in enumerate(self.__rules):
+            if changed[rule.getConcept()] or self.__scores[pos] is None:
+                self.__scores[pos] = self.__getScore(rule, values[rule.getConcept()], ratio)
+            total += self.__scores[pos]
+
+        order = np.argsort(-total, kind='mergesort')
+        return [(members[pos], total[pos]) for pos in order]
+
+
 class BasicOrganizerWindow(object):
     def __init__(self, feed, rules, groups=None):
         self.__feed = feed
-        self.__rules = rules
-        self.__groups = groups
+        self.__engine = RankingEngine(rules, groups)
         self.__value = None
 
     def onNewValue(self, dateTime, bars):
-        members = self.__feed.getMembers()
-
-        ranking = {}
-        for instrument in members:
-            ranking[instrument] = 0
-        scores = {}
-
-        ratio = 1
-        if self.__groups:
-            ratio = len(ranking) / float(self.__groups)
-
-        for rule in self.__rules:
-            concept = rule.getConcept()
-            flip = rule.isAsc()
-            weight = rule.getWeight()
-
-            score = {}
-            for instrument in members:
-                if instrument in bars:
-                    bar = bars[instrument]
-                    score[instrument] = bar.getField(concept)
-                else:
-                    score[instrument] = None
-            score = sorted(score.items(), key=(lambda item: ((item[1] is None) is flip, item[1])), reverse=flip)
-            scores[concept] = score
-
-            lastValue = None
-            rankNum = 1
-            prevRank = 1
-            for instrument, value in score:
-                rank = rankNum
-                if value == lastValue:
-                    rank = prevRank
-                if value is not None:
-                    ranking[instrument] += math.ceil(rank / ratio) * weight
-                prevRank = rank
-                lastValue = value
-                rankNum += 1
-
-        ranking = sorted(ranking.items(), key=(lambda item: item[1]), reverse=True)
-        self.__value = ranking
+        self.__value = self.__engine.rank(self.__feed.getMembers(), bars)
 
     def getValue(self):
         return self.__value
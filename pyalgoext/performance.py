@@ -0,0 +1,277 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import collections
+import datetime
+import math
+
+from pyalgotrade import stratanalyzer
+from pyalgotrade.stratanalyzer import drawdown
+from pyalgotrade.stratanalyzer import returns
+from pyalgotrade.stratanalyzer import trades
+
+
+class RunningStats(object):
+    """Count, mean and sample standard deviation of a stream of values, updated in O(1)
+    per value with the Welford algorithm, without keeping the values."""
+
+    def __init__(self):
+        self.__count = 0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+
+    def add(self, value):
+        self.__count += 1
+        delta = value - self.__mean
+        self.__mean += delta / self.__count
+        self.__m2 += delta * (value - self.__mean)
+
+    def copy(self):
+        ret = RunningStats()
+        ret.__count = self.__count
+        ret.__mean = self.__mean
+        ret.__m2 = self.__m2
+        return ret
+
+    def getCount(self):
+        return self.__count
+
+    def getMean(self):
+        """The mean, or None until there is a value."""
+        if self.__count == 0:
+            return None
+        return self.__mean
+
+    def getStdDev(self):
+        """The sample standard deviation, or None until there are two values."""
+        if self.__count < 2:
+            return None
+        return math.sqrt(max(self.__m2, 0.0) / (self.__count - 1))
+
+
+class TradeStats(trades.Trades):
+    """A :class:`pyalgotrade.stratanalyzer.trades.Trades` that only keeps the counts, the mean
+    profit and loss and the total commissions of the completed trades, instead of one entry
+    per trade in several lists.
+    """
+
+    def __init__(self):
+        super(TradeStats, self).__init__()
+        self.__profits = RunningStats()
+        self.__losses = RunningStats()
+        self.__evenCount = 0
+        self.__commissions = 0.0
+
+    # Replaces the private method of Trades that appends every completed trade to its lists.
+    def _Trades__updateTrades(self, posTracker):
+        price = 0  # The price doesn't matter since the position should be closed.
+        assert posTracker.getPosition() == 0
+        netProfit = posTracker.getPnL(price)
+        if netProfit > 0:
+            self.__profits.add(netProfit)
+        elif netProfit < 0:
+            self.__losses.add(netProfit)
+        else:
+            self.__evenCount += 1
+        self.__commissions += posTracker.getCommissions()
+        posTracker.reset()
+
+    def getCount(self):
+        return self.__profits.getCount() + self.__losses.getCount() + self.__evenCount
+
+    def getProfitableCount(self):
+        return self.__profits.getCount()
+
+    def getUnprofitableCount(self):
+        return self.__losses.getCount()
+
+    def getEvenCount(self):
+        return self.__evenCount
+
+    def getMeanProfit(self):
+        return self.__profits.getMean()
+
+    def getMeanLoss(self):
+        return self.__losses.getMean()
+
+    def getCommissions(self):
+        return self.__commissions
+
+
+class PerformanceReport(stratanalyzer.StrategyAnalyzer):
+    """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that gathers the usual figures of a
+    backtest in a single pass: returns, volatility, Sharpe ratio, drawdown, mean gain and loss
+    and trade statistics. Every figure is accumulated while the strategy runs, so no returns
+    series or trade lists are kept and the memory used does not grow with the run.
+
+    Volatility and the mean returns come from the returns of each bar, the Sharpe ratio from
+    the daily returns, like :class:`pyalgotrade.stratanalyzer.sharpe.SharpeRatio`.
+
+    :param riskFreeRate: the risk free rate per annum used for the Sharpe ratio.
+    :type riskFreeRate: float.
+    :param tradingPeriods: the number of bars per annum used to annualize the volatility.
+    :type tradingPeriods: int.
+    """
+
+    FIELDS = [
+        'capStart', 'capEnd', 'return', 'annualReturn', 'volatility', 'sharpe',
+        'maxDrawDown', 'longestDrawDownDays', 'meanReturn', 'meanGain', 'meanLoss',
+        'meanProfit', 'meanLossPerTrade', 'commissions', 'evenCount', 'profitableCount', 'unprofitableCount',
+    ]
+
+    def __init__(self, riskFreeRate=0.0036, tradingPeriods=252):
+        super(PerformanceReport, self).__init__()
+        self.__riskFreeRate = riskFreeRate
+        self.__tradingPeriods = tradingPeriods
+        self.__broker = None
+        self.__capStart = None
+        self.__firstDateTime = None
+        self.__lastDateTime = None
+        self.__returns = RunningStats()
+        self.__gains = RunningStats()
+        self.__losses = RunningStats()
+        self.__dailyReturns = RunningStats()
+        self.__currentDate = None
+        self.__dailyReturn = None
+        self.__drawDown = drawdown.DrawDownHelper()
+        self.__maxDrawDown = 0
+        self.__longestDrawDown = datetime.timedelta()
+        self.__trades = TradeStats()
+
+    def beforeAttach(self, strat):
+        # Get or create a shared ReturnsAnalyzerBase
+        analyzer = returns.ReturnsAnalyzerBase.getOrCreateShared(strat)
+        analyzer.getEvent().subscribe(self.__onReturns)
+        strat.attachAnalyzer(self.__trades)
+
+    def attached(self, strat):
+        self.__broker = strat.getBroker()
+        self.__capStart = self.__broker.getEquity()
+
+    def beforeOnBars(self, strat, bars):
+        dateTime = bars.getDateTime()
+        if self.__firstDateTime is None:
+            self.__firstDateTime = dateTime
+        self.__lastDateTime = dateTime
+
+        equity = self.__broker.getEquity()
+        self.__drawDown.update(dateTime, equity, equity)
+        self.__longestDrawDown = max(self.__longestDrawDown, self.__drawDown.getDuration())
+        self.__maxDrawDown = min(self.__maxDrawDown, self.__drawDown.getMaxDrawDown())
+
+    def __onReturns(self, dateTime, returnsAnalyzerBase):
+        netReturn = returnsAnalyzerBase.getNetReturn()
+        self.__returns.add(netReturn)
+        if netReturn > 0:
+            self.__gains.add(netReturn)
+        elif netReturn < 0:
+            self.__losses.add(netReturn)
+
+        # Daily returns, only added once the day is complete.
+        if dateTime.date() == self.__currentDate:
+            self.__dailyReturn = (1 + self.__dailyReturn) * (1 + netReturn) - 1
+        else:
+            if self.__dailyReturn is not None:
+                self.__dailyReturns.add(self.__dailyReturn)
+            self.__currentDate = dateTime.date()
+            self.__dailyReturn = netReturn
+
+    def getTrades(self):
+        return self.__trades
+
+    def getSharpeRatio(self):
+        """The annualized Sharpe ratio of the daily returns, 0 if the volatility is 0."""
+        # The current day is not complete yet but counts as well.
+        dailyReturns = self.__dailyReturns.copy()
+        if self.__dailyReturn is not None:
+            dailyReturns.add(self.__dailyReturn)
+
+        volatility = dailyReturns.getStdDev()
+        if not volatility:
+            return 0.0
+        excessReturn = dailyReturns.getMean() - self.__riskFreeRate / float(self.__tradingPeriods)
+        return excessReturn / volatility * math.sqrt(self.__tradingPeriods)
+
+    def getReport(self):
+        """Returns an ordered dict with every figure of :attr:`FIELDS`. Figures that can not be
+        calculated, like the mean loss without losing trades, are None."""
+        capStart = self.__capStart
+        capEnd = self.__broker.getEquity()
+        annualReturn = None
+        if self.__firstDateTime is not None and self.__lastDateTime > self.__firstDateTime:
+            days = (self.__lastDateTime - self.__firstDateTime).days
+            if days > 0:
+                annualReturn = math.pow(capEnd / capStart, 365.0 / days) - 1
+        volatility = self.__returns.getStdDev()
+        if volatility is not None:
+            volatility *= math.sqrt(self.__tradingPeriods)
+
+        ret = collections.OrderedDict()
+        ret['capStart'] = capStart
+        ret['capEnd'] = capEnd
+        ret['return'] = (capEnd - capStart) / capStart
+        ret['annualReturn'] = annualReturn
+        ret['volatility'] = volatility
+        ret['sharpe'] = self.getSharpeRatio()
+        ret['maxDrawDown'] = abs(self.__maxDrawDown)
+        ret['longestDrawDownDays'] = self.__longestDrawDown.days
+        ret['meanReturn'] = self.__returns.getMean()
+        ret['meanGain'] = self.__gains.getMean()
+        ret['meanLoss'] = self.__losses.getMean()
+        ret['meanProfit'] = self.__trades.getMeanProfit()
+        ret['meanLossPerTrade'] = self.__trades.getMeanLoss()
+        ret['commissions'] = self.__trades.getCommissions()
+        ret['evenCount'] = self.__trades.getEvenCount()
+        ret['profitableCount'] = self.__trades.getProfitableCount()
+        ret['unprofitableCount'] = self.__trades.getUnprofitableCount()
+        return ret
+
+    def getRow(self):
+        """The figures of :meth:`getReport` as a list, in the order of :attr:`FIELDS`, for CSV files."""
+        return list(self.getReport().values())
+
+    def logReport(self, strat):
+        """Logs the report through the strategy logger."""
+        report = self.getReport()
+
+        def percent(value):
+            return "-" if value is None else "%.4f%%" % (100 * value)
+
+        strat.info("CAPITAL FINAL: $%.4f" % report['capEnd'])
+        strat.info(" ")
+        strat.info("Rentabilidad: %s" % percent(report['return']))
+        strat.info("Rentabilidad Anualizada: %s" % percent(report['annualReturn']))
+        strat.info("Volatilidad Anualizada: %s" % percent(report['volatility']))
+        strat.info("Ratio de Sharpe Anualizado: %.4f" % report['sharpe'])
+        strat.info("DrawDown Maximo: %s" % percent(report['maxDrawDown']))
+        strat.info("DrawDown Mas Largo: %s dias" % report['longestDrawDownDays'])
+        strat.info(" ")
+        strat.info("Rentabilidad Media: %s" % percent(report['meanReturn']))
+        strat.info("Ganancia Media: %s" % percent(report['meanGain']))
+        strat.info("Perdida Media: %s" % percent(report['meanLoss']))
+        strat.info(" ")
+        strat.info("Ganancia Media por Op: $%s" % report['meanProfit'])
+        strat.info("Perdida Media por Op: $%s" % report['meanLossPerTrade'])
+        strat.info("Comisiones Totales: $%s" % report['commissions'])
+        strat.info("Num Ops Igual: %s" % report['evenCount'])
+        strat.info("Num Ops Gano: %s" % report['profitableCount'])
+        strat.info("Num Ops Pierdo: %s" % report['unprofitableCount'])
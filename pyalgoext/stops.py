@@ -0,0 +1,245 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import numpy as np
+from pyalgotrade import broker
+
+
+class Stop(object):
+    """An exit stop order of a position and how its stop price moves.
+
+    :param order: the :class:`pyalgotrade.broker.StopOrder` submitted as the exit of the position.
+    :param kind: :attr:`StopManager.FIXED` or :attr:`StopManager.SESSION_OPEN`.
+    :param pricePer: the distance to the reference price, as a fraction of it.
+    :param refPrice: the initial reference price.
+    :param date: the date of the session of the reference price.
+    """
+
+    def __init__(self, order, kind, pricePer, refPrice, date):
+        self.__order = order
+        self.__kind = kind
+        self.__sell = order.getAction() == broker.Order.Action.SELL
+        self.__factor = 1 - pricePer if self.__sell else 1 + pricePer
+        self.__refPrice = refPrice
+        self.__date = date
+
+    def getOrder(self):
+        return self.__order
+
+    def getKind(self):
+        return self.__kind
+
+    def getRefPrice(self):
+        return self.__refPrice
+
+    def getStopPrice(self):
+        return self.__order.getStopPrice()
+
+    def update(self, dateTime, price):
+        if self.__kind == StopManager.SESSION_OPEN:
+            # Only the first bar of every session moves it, up or down.
+            date = dateTime.date()
+            if date == self.__date:
+                return
+            self.__date = date
+            self.__refPrice = price
+            self.__order._StopOrder__stopPrice = self.__refPrice * self.__factor
+
+
+class TrailingStopBook(object):
+    """Keeps the trailing exit stops of a strategy in NumPy arrays: the reference price, the distance
+    and the side of every stop. Once every bar is processed the reference prices of all the stops
+    move in one vectorized step, and only the orders whose stop price changed are touched, so the
+    broker reads precomputed stop prices instead of recalculating them for every order on every bar.
+    The broker still decides which stops are hit, with the same fill strategy as any other stop order.
+    Like :class:`StopManager`, the stop price in effect for a bar comes from the bars before it.
+
+    :param strat: the :class:`pyalgotrade.strategy.BacktestingStrategy` owning the stops.
+    :param capacity: the initial number of stops, the arrays grow as needed.
+    """
+
+    def __init__(self, strat, capacity=64):
+        self.__instruments = {}
+        self.__orders = []
+        self.__slots = {}
+        self.__column = np.zeros(capacity, dtype=int)
+        self.__refPrice = np.zeros(capacity)
+        self.__factor = np.zeros(capacity)
+        self.__sell = np.zeros(capacity, dtype=bool)
+        strat.getBarsProcessedEvent().subscribe(self.__onBarsProcessed)
+        strat.getBroker().getOrderUpdatedEvent().subscribe(self.__onOrderUpdated)
+
+    def __grow(self):
+        capacity = 2 * len(self.__refPrice)
+        for name in ['_TrailingStopBook__column', '_TrailingStopBook__refPrice', '_TrailingStopBook__factor', '_TrailingStopBook__sell']:
+            values = getattr(self, name)
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            setattr(self, name, grown)
+
+    def exitTrailing(self, position, pricePer, goodTillCanceled=False):
+        """Exits a position with a stop order pricePer away from the best price since the entry,
+        starting with the entry price."""
+        refPrice = position.getEntryOrder().getExecutionInfo().getPrice()
+        sell = position.getShares() > 0
+        factor = 1 - pricePer if sell else 1 + pricePer
+        position.exitStop(refPrice * factor, goodTillCanceled)
+        order = position.getExitOrder()
+
+        slot = len(self.__orders)
+        if slot == len(self.__refPrice):
+            self.__grow()
+        self.__column[slot] = self.__instruments.setdefault(position.getInstrument(), len(self.__instruments))
+        self.__refPrice[slot] = refPrice
+        self.__factor[slot] = factor
+        self.__sell[slot] = sell
+        self.__orders.append(order)
+        self.__slots[order.getId()] = slot
+        return order
+
+    def getActiveCount(self):
+        return len(self.__orders)
+
+    def getStopPrices(self):
+        """Returns a dict with the stop price of every active order id."""
+        count = len(self.__orders)
+        stopPrices = self.__refPrice[:count] * self.__factor[:count]
+        return dict((order.getId(), float(stopPrice)) for order, stopPrice in zip(self.__orders, stopPrices))
+
+    def __onBarsProcessed(self, strat, bars):
+        count = len(self.__orders)
+        if count == 0:
+            return
+        prices = np.full(len(self.__instruments), np.nan)
+        for instrument, column in self.__instruments.items():
+            bar = bars.getBar(instrument)
+            if bar is not None:
+                prices[column] = bar.getPrice()
+
+        price = prices[self.__column[:count]]
+        refPrice = self.__refPrice[:count]
+        # Only moves in favour of the position. Comparisons with NaN, no bar, are False.
+        with np.errstate(invalid='ignore'):
+            moved = np.where(self.__sell[:count], price > refPrice, price < refPrice)
+        slots = np.flatnonzero(moved)
+        if len(slots):
+            refPrice[slots] = price[slots]
+            stopPrices = refPrice[slots] * self.__factor[slots]
+            for slot, stopPrice in zip(slots, stopPrices):
+                self.__orders[slot]._StopOrder__stopPrice = float(stopPrice)
+
+    def __onOrderUpdated(self, broker_, orderEvent):
+        order = orderEvent.getOrder()
+        if order.isActive():
+            return
+        slot = self.__slots.pop(order.getId(), None)
+        if slot is None:
+            return
+        # Move the last stop into the free slot.
+        last = len(self.__orders) - 1
+        if slot != last:
+            lastOrder = self.__orders[last]
+            self.__orders[slot] = lastOrder
+            self.__slots[lastOrder.getId()] = slot
+            self.__column[slot] = self.__column[last]
+            self.__refPrice[slot] = self.__refPrice[last]
+            self.__factor[slot] = self.__factor[last]
+            self.__sell[slot] = self.__sell[last]
+        self.__orders.pop()
+
+
+class StopManager(object):
+    """Keeps the active exit stops of a strategy in per-instrument tables and moves them
+    in a single pass once every bar is processed, so the stop price in effect for a bar
+    comes from the bars before it. Stops are dropped as soon as their order is filled or
+    canceled, so the cost per bar is proportional to the active stops.
+
+    Build it once in the strategy constructor, and submit the exits through it instead of
+    :meth:`pyalgotrade.strategy.position.Position.exitStop`.
+
+    :param strat: the :class:`pyalgotrade.strategy.BacktestingStrategy` owning the stops.
+    """
+
+    FIXED = 0
+    SESSION_OPEN = 1
+    TRAILING = 2
+
+    def __init__(self, strat):
+        self.__stops = {}
+        self.__instruments = {}
+        self.__trailing = TrailingStopBook(strat)
+        strat.getBarsProcessedEvent().subscribe(self.__onBarsProcessed)
+        strat.getBroker().getOrderUpdatedEvent().subscribe(self.__onOrderUpdated)
+
+    def __add(self, position, stopPrice, goodTillCanceled, kind, pricePer, refPrice):
+        position.exitStop(stopPrice, goodTillCanceled)
+        order = position.getExitOrder()
+        instrument = position.getInstrument()
+        date = position.getStrategy().getCurrentDateTime().date()
+        self.__stops.setdefault(instrument, {})[order.getId()] = Stop(order, kind, pricePer, refPrice, date)
+        self.__instruments[order.getId()] = instrument
+        return order
+
+    def exitFixed(self, position, stopPrice, goodTillCanceled=False):
+        """Exits a position with a stop order at a fixed price."""
+        return self.__add(position, stopPrice, goodTillCanceled, StopManager.FIXED, 0, stopPrice)
+
+    def exitSessionOpen(self, position, pricePer, goodTillCanceled=False):
+        """Exits a position with a stop order pricePer away from the price of the first bar of every session,
+        starting with the last price."""
+        refPrice = position.getLastPrice()
+        factor = 1 - pricePer if position.getShares() > 0 else 1 + pricePer
+        return self.__add(position, refPrice * factor, goodTillCanceled, StopManager.SESSION_OPEN, pricePer, refPrice)
+
+    def exitTrailing(self, position, pricePer, goodTillCanceled=False):
+        """Exits a position with a stop order pricePer away from the best price since the entry,
+        starting with the entry price. Trailing stops are kept in a :class:`TrailingStopBook`."""
+        return self.__trailing.exitTrailing(position, pricePer, goodTillCanceled)
+
+    def getTrailingStopBook(self):
+        return self.__trailing
+
+    def getStops(self, instrument):
+        """Returns the active fixed and session-open :class:`Stop` of an instrument."""
+        return list(self.__stops.get(instrument, {}).values())
+
+    def getActiveCount(self):
+        return len(self.__instruments) + self.__trailing.getActiveCount()
+
+    def __onBarsProcessed(self, strat, bars):
+        dateTime = bars.getDateTime()
+        for instrument, table in self.__stops.items():
+            bar = bars.getBar(instrument)
+            if bar is not None:
+                price = bar.getPrice()
+                for stop in table.values():
+                    stop.update(dateTime, price)
+
+    def __onOrderUpdated(self, broker_, orderEvent):
+        order = orderEvent.getOrder()
+        if not order.isActive():
+            instrument = self.__instruments.pop(order.getId(), None)
+            if instrument is not None:
+                table = self.__stops[instrument]
+                del table[order.getId()]
+                if not table:
+                    del self.__stops[instrument]
@@ -0,0 +1,211 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import bisect
+import collections
+import datetime
+import logging
+import multiprocessing
+
+from pyalgotrade import logger
+from pyalgotrade import strategy
+from pyalgoext import multirun
+from pyalgoext import optimizer
+
+
+######################################################################
+## Rolling-window studies
+#
+# A study runs a strategy with several parameter tuples on several windows of the
+# same history, and a benchmark once per window. The history is read once into a
+# :class:`pyalgoext.optimizer.BarStore`; the worker processes build its bars once and
+# every job gets a feed over a slice of them, instead of re-reading the CSV files.
+# The strategies of a job, and the benchmark of the window in the first job, run
+# together in one pass over that feed with :func:`pyalgoext.multirun.run`.
+
+
+def year_windows(startYear, endYear, years):
+    """Returns the (label, fromDateTime, toDateTime) windows of years years from startYear
+    until endYear (excluded), the last one possibly shorter. toDateTime is excluded.
+    """
+    ret = []
+    for year in range(startYear, endYear, years):
+        lastYear = min(year + years, endYear)
+        ret.append(("%d-%d" % (year, lastYear), datetime.datetime(year, 1, 1), datetime.datetime(lastYear, 1, 1)))
+    return ret
+
+
+# Worker state, inherited on fork or set once per worker by the initializer.
+_worker = {}
+
+
+def _init_worker(strategyClass, benchmarkClass, store, logLevel):
+    logger.getLogger(strategy.BaseStrategy.LOGGER_NAME).setLevel(logLevel)
+    _worker['classes'] = {'strategy': strategyClass, 'benchmark': benchmarkClass}
+    _worker['store'] = store
+    _worker['bars'] = store.getBars()
+    _worker['dateTimes'] = [bars.getDateTime() for bars in _worker['bars']]
+
+
+def _run_job(job):
+    fromDateTime, toDateTime, benchmarkParameters, chunk = job
+    dateTimes = _worker['dateTimes']
+    start = bisect.bisect_left(dateTimes, fromDateTime)
+    end = bisect.bisect_left(dateTimes, toDateTime)
+    feed = _worker['store'].getFeed(_worker['bars'][start:end])
+
+    runs = [(_worker['classes']['strategy'], parameters) for parameters in chunk]
+    if benchmarkParameters is not None:
+        runs.insert(0, (_worker['classes']['benchmark'], benchmarkParameters))
+    try:
+        strategies = [strategyClass(feed, *parameters) for strategyClass, parameters in runs]
+        multirun.run(strategies)
+        return [strat.getResult() for strat in strategies]
+    except Exception as e:
+        logger.getLogger("studies").error("Error running %s: %s" % ([parameters for strategyClass, parameters in runs], e))
+        return [None] * len(runs)
+
+
+def run(strategyClass, barFeed, windows, strategyParameters, benchmarkClass=None, benchmarkParameters=None, workerCount=None, chunkSize=10, logLevel=logging.ERROR):
+    """Runs every strategy parameter tuple on every window, and the benchmark once per window, in parallel.
+
+    :param strategyClass: the strategy class, built as strategyClass(feed, *parameters).
+    :param barFeed: the feed with the whole history, or a :class:`pyalgoext.optimizer.BarStore`.
+    :param windows: a list of (label, fromDateTime, toDateTime) tuples, toDateTime excluded, like :func:`year_windows`.
+    :param strategyParameters: a list of parameter tuples.
+    :param benchmarkClass: the benchmark strategy class, or None.
+    :param benchmarkParameters: the parameter tuple of the benchmark. Defaults to the first strategy parameters.
+    :param workerCount: the number of worker processes, by default the number of CPUs.
+    :param chunkSize: the number of parameter tuples run together in one pass over a window.
+    :param logLevel: the log level of the strategies inside the workers.
+    :rtype: a list of [label, parameters..., result, benchmark result, delta] rows, window by window.
+    """
+    strategyParameters = [tuple(parameters) for parameters in strategyParameters]
+    if benchmarkParameters is None and strategyParameters:
+        benchmarkParameters = strategyParameters[0]
+
+    chunks = list(optimizer.get_chunks(strategyParameters, chunkSize)) or [[]]
+    jobs = []
+    for label, fromDateTime, toDateTime in windows:
+        for pos, chunk in enumerate(chunks):
+            benchmark = benchmarkParameters if benchmarkClass is not None and pos == 0 else None
+            jobs.append((fromDateTime, toDateTime, benchmark, chunk))
+
+    store = barFeed if isinstance(barFeed, optimizer.BarStore) else optimizer.BarStore.fromFeed(barFeed)
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+    log = logger.getLogger("studies")
+    log.info("Running %d jobs on %d sessions of %s" % (len(jobs), len(store.getDateTimes()), ", ".join(store.getInstruments())))
+
+    pool = multiprocessing.Pool(workerCount, _init_worker, (strategyClass, benchmarkClass, store, logLevel))
+    try:
+        results = pool.map(_run_job, jobs, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    ret = []
+    results = iter(results)
+    for label, fromDateTime, toDateTime in windows:
+        windowResults = []
+        for chunk in chunks:
+            windowResults.extend(next(results))
+        benchmark = windowResults.pop(0) if benchmarkClass is not None else None
+        for parameters, result in zip(strategyParameters, windowResults):
+            delta = None
+            if result is not None and benchmark is not None:
+                delta = result - benchmark
+            ret.append([label] + list(parameters) + [result, benchmark, delta])
+    return ret
+
+
+######################################################################
+## Batches of configurations
+#
+# A batch runs a function, like the run_strategy of a script, once per configuration of
+# keyword arguments, and collects the dict it returns into one table. Whatever the
+# function loads and keeps at module level is loaded once per worker, or once in total
+# if it is loaded before calling :func:`run_configurations`, as the workers are forked.
+
+
+def _init_batch_worker(logLevel):
+    logger.getLogger(strategy.BaseStrategy.LOGGER_NAME).setLevel(logLevel)
+
+
+def _run_configuration(job):
+    function, parameters = job
+    try:
+        return function(**parameters)
+    except Exception as e:
+        logger.getLogger("studies").error("Error running %s.%s %s: %s" % (function.__module__, function.__name__, parameters, e))
+        return None
+
+
+def run_configurations(configurations, workerCount=None, logLevel=logging.ERROR):
+    """Runs every configuration in parallel and collects their results in one table.
+
+    :param configurations: a list of (function, parameters) tuples. function is a module level function,
+        called as function(**parameters), that returns a dict of figures such as
+        :meth:`pyalgoext.performance.PerformanceReport.getReport`.
+    :param workerCount: the number of worker processes, by default the number of CPUs.
+    :param logLevel: the log level of the strategies inside the workers.
+    :rtype: a list of ordered dicts, one per configuration in the same order, with the function name,
+        the parameters sorted by name and the figures returned, none if the run failed.
+    """
+    if workerCount is None:
+        workerCount = multiprocessing.cpu_count()
+    log = logger.getLogger("studies")
+    log.info("Running %d configurations" % len(configurations))
+
+    pool = multiprocessing.Pool(workerCount, _init_batch_worker, (logLevel,))
+    try:
+        results = pool.map(_run_configuration, configurations, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    ret = []
+    for (function, parameters), result in zip(configurations, results):
+        row = collections.OrderedDict()
+        row['function'] = "%s.%s" % (function.__module__, function.__name__)
+        for name in sorted(parameters.keys()):
+            row[name] = parameters[name]
+        if result is not None:
+            row.update(result)
+        ret.append(row)
+    return ret
+
+
+def get_fields(rows):
+    """The union of the keys of several rows, in order of appearance, as the header of a table."""
+    ret = []
+    for row in rows:
+        for name in row.keys():
+            if name not in ret:
+                ret.append(name)
+    return ret
@@ -0,0 +1,255 @@
+# PyAlgoExt
+# Extensions to the PyAlgoTrade Library
+#
+# Copyright 2015-2016 Isaac de la Pena
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+.. moduleauthor:: Isaac de la Pena <isaacdlp@agoraeafi.com>
+"""
+
+
+import random
+
+import numpy as np
+from pyalgotrade import strategy
+from pyalgotrade.broker import backtesting
+from pyalgotrade.technical import ma, cross
+
+
+def sma_matrix(prices, windows):
+    """Returns a (sessions, windows) matrix with the simple moving average of each window, NaN until it is full."""
+    sums = np.concatenate(([0.0], np.cumsum(prices)))
+    ret = np.full((len(prices), len(windows)), np.nan)
+    for col, window in enumerate(windows):
+        if window <= len(prices):
+            ret[window - 1:, col] = (sums[window:] - sums[:-window]) / float(window)
+    return ret
+
+
+class SmaCrossResults(object):
+    def __init__(self, parameters, equity, finalEquity, trades, commissions):
+        self.__parameters = parameters
+        self.__equity = equity
+        self.__finalEquity = finalEquity
+        self.__trades = trades
+        self.__commissions = commissions
+
+    def getParameters(self):
+        return self.__parameters
+
+    def getEquity(self):
+        """The (sessions, combinations) equity curves, or None if they were not kept."""
+        return self.__equity
+
+    def getFinalEquity(self):
+        return self.__finalEquity
+
+    def getTrades(self):
+        return self.__trades
+
+    def getCommissions(self):
+        return self.__commissions
+
+    def getBest(self):
+        pos = int(np.argmax(self.__finalEquity))
+        return self.__parameters[pos], self.__finalEquity[pos]
+
+
+class SmaCrossEngine(object):
+    """Backtests a long-only SMA crossover strategy for many (smaShort, smaLong, stopPer) combinations at once.
+
+    The sessions are walked once and every combination is updated with array operations, following
+    the same rules as :class:`SmaCrossStrategy` on the pyalgotrade backtesting broker:
+
+    * Enter when the short SMA crosses above the long SMA, with 95% of the equity, at the next open.
+    * Exit when it crosses below, at the next open.
+    * An optional stop loss at stopPer below the entry price, active from the session after the entry.
+    * TradePercentage commissions on every fill.
+
+    :param values: a (sessions, 6) matrix of open, high, low, close, volume and adjusted close,
+        like :meth:`pyalgoext.optimizer.BarStore.getValues`.
+    :param capital: the initial cash of every combination.
+    :param commission: the commission as a percentage of the traded amount.
+    :param useAdjustedValues: True to trade on adjusted prices, as the strategies here do.
+    """
+
+    def __init__(self, values, capital=1000000, commission=0.002, useAdjustedValues=True, liquidity=0.05):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values[:, 3])]
+        open_, high, low, close = values[:, 0], values[:, 1], values[:, 2], values[:, 3]
+        if useAdjustedValues:
+            factor = values[:, 5] / close
+            open_, high, low, close = open_ * factor, high * factor, low * factor, values[:, 5]
+        self.__open = open_
+        self.__high = high
+        self.__low = low
+        self.__close = close
+        self.__capital = capital
+        self.__commission = commission
+        self.__liquidity = liquidity
+
+    def run(self, parameters, keepEquity=False):
+        """Runs every (smaShort, smaLong, stopPer) tuple; stopPer may be None for no stop.
+
+        :rtype: :class:`SmaCrossResults`.
+        """
+        parameters = list(parameters)
+        count = len(parameters)
+        sessions = len(self.__close)
+
+        shortWindows = sorted(set(p[0] for p in parameters))
+        longWindows = sorted(set(p[1] for p in parameters))
+        shortSma = sma_matrix(self.__close, shortWindows)
+        longSma = sma_matrix(self.__close, longWindows)
+        shortCol = np.array([shortWindows.index(p[0]) for p in parameters])
+        longCol = np.array([longWindows.index(p[1]) for p in parameters])
+        stopPer = np.array([p[2] if p[2] is not None else np.nan for p in parameters], dtype=float)
+
+        cash = np.full(count, float(self.__capital))
+        shares = np.zeros(count)
+        pendingEntry = np.zeros(count)
+        pendingExit = np.zeros(count, dtype=bool)
+        stopPrice = np.full(count, np.nan)
+        armedStop = np.full(count, np.nan)
+        trades = np.zeros(count, dtype=int)
+        commissions = np.zeros(count)
+        equity = np.empty((sessions, count)) if keepEquity else None
+        prevDiff = np.full(count, np.nan)
+
+        for t in range(sessions):
+            open_ = self.__open[t]
+            # Stops are submitted when the entry fills and processed from the next session on.
+            stopPrice = np.where(np.isnan(armedStop), stopPrice, armedStop)
+
+            # Broker: fill the orders submitted on the previous session.
+            fill = pendingExit
+            if fill.any():
+                amount = shares[fill] * open_
+                cash[fill] += amount - amount * self.__commission
+                commissions[fill] += amount * self.__commission
+                shares[fill] = 0
+                pendingExit = np.zeros(count, dtype=bool)
+
+            stopHit = ~np.isnan(stopPrice) & (self.__low[t] <= stopPrice)
+            if stopHit.any():
+                price = np.where(open_ < stopPrice[stopHit], open_, stopPrice[stopHit])
+                amount = shares[stopHit] * price
+                cash[stopHit] += amount - amount * self.__commission
+                commissions[stopHit] += amount * self.__commission
+                shares[stopHit] = 0
+                stopPrice[stopHit] = np.nan
+
+            fill = pendingEntry > 0
+            if fill.any():
+                amount = pendingEntry[fill] * open_
+                cash[fill] -= amount + amount * self.__commission
+                commissions[fill] += amount * self.__commission
+                shares[fill] = pendingEntry[fill]
+                trades[fill] += 1
+                pendingEntry[fill] = 0
+            armedStop = np.where(fill & ~np.isnan(stopPer), open_ * (1 - stopPer), np.nan)
+
+            value = cash + shares * self.__close[t]
+            if keepEquity:
+                equity[t] = value
+
+            # Strategy: cross signals over the last two sessions.
+            diff = shortSma[t, shortCol] - longSma[t, longCol]
+            with np.errstate(invalid='ignore'):
+                crossAbove = (prevDiff < 0) & (diff > 0)
+                crossBelow = (prevDiff > 0) & (diff < 0)
+            prevDiff = diff
+
+            exit = crossBelow & (shares > 0)
+            pendingExit = exit
+            stopPrice[exit] = np.nan
+            armedStop[exit] = np.nan
+
+            enter = crossAbove & (shares == 0) & (pendingEntry == 0)
+            if enter.any():
+                perInstrument = np.minimum(value[enter], cash[enter]) * (1 - self.__liquidity)
+                pendingEntry[enter] = np.floor(perInstrument / self.__close[t])
+
+        finalEquity = cash + shares * self.__close[-1] if sessions else cash
+        return SmaCrossResults(parameters, equity, finalEquity, trades, commissions)
+
+
+class SmaCrossStrategy(strategy.BacktestingStrategy):
+    """Event-driven reference of :class:`SmaCrossEngine`, the long side of the optimizers' MyBasicStrategy."""
+
+    def __init__(self, feed, instrument, smaShort, smaLong, stopPer=None, capital=1000000, commission=0.002):
+        myBroker = backtesting.Broker(capital, feed, backtesting.TradePercentage(commission))
+        myBroker.setAllowNegativeCash(True)
+        myBroker.getFillStrategy().setVolumeLimit(None)
+
+        super(SmaCrossStrategy, self).__init__(feed, myBroker)
+
+        self._instrument = instrument
+        self._liquidity = 0.05
+        self._stopPer = stopPer
+        self._position = None
+        # Before building the SMAs, since getPriceDataSeries picks the close or adjusted close series.
+        self.setUseAdjustedValues(True)
+        self._smaShort = ma.SMA(feed[instrument].getPriceDataSeries(), smaShort)
+        self._smaLong = ma.SMA(feed[instrument].getPriceDataSeries(), smaLong)
+
+    def onEnterOk(self, position):
+        if self._stopPer is not None:
+            position.exitStop(position.getEntryOrder().getExecutionInfo().getPrice() * (1 - self._stopPer), True)
+
+    def onEnterCanceled(self, position):
+        self._position = None
+
+    def onExitOk(self, position):
+        self._position = None
+
+    def onExitCanceled(self, position):
+        position.exitMarket()
+
+    def onBars(self, bars):
+        if self._smaLong[-1] is None or self._instrument not in bars:
+            return
+
+        if self._position is not None:
+            if cross.cross_below(self._smaShort, self._smaLong):
+                order = self._position.getExitOrder()
+                if not order:
+                    self._position.exitMarket()
+                elif not isinstance(order, backtesting.MarketOrder):
+                    self._position.cancelExit()
+        elif cross.cross_above(self._smaShort, self._smaLong):
+            perInstrument = min(self.getBroker().getEquity(), self.getBroker().getCash()) * (1 - self._liquidity)
+            amount = int(perInstrument / bars[self._instrument].getPrice())
+            if amount > 0:
+                self._position = self.enterLong(self._instrument, amount, True)
+
+
+def crosscheck(store, instrument, parameters, sample=10, capital=1000000, seed=None):
+    """Runs a sample of the combinations with both :class:`SmaCrossEngine` and :class:`SmaCrossStrategy`.
+
+    :param store: a :class:`pyalgoext.optimizer.BarStore` with the instrument.
+    :rtype: a list of (parameters, vectorized equity, event-driven equity) tuples.
+    """
+    parameters = list(parameters)
+    picked = random.Random(seed).sample(parameters, min(sample, len(parameters)))
+    results = SmaCrossEngine(store.getValues(instrument), capital).run(picked)
+
+    ret = []
+    bars = store.getBars()
+    for combination, vectorized in zip(picked, results.getFinalEquity()):
+        strat = SmaCrossStrategy(store.getFeed(bars), instrument, combination[0], combination[1], combination[2], capital)
+        strat.run()
+        ret.append((combination, vectorized, strat.getResult()))
+    return ret
@@ -33,10 +33,14 @@ import datetime
 ## Visual Chart CSV parser
 # Each bar must be on its own line and fields must be separated by comma (,).
 #
-# Bars Format:
-# Date,Open,High,Low,Close,Volume,Adj Close
+# Bars Format, in any column order:
+# <TICKER>,<DTYYYYMMDD>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,...
 #
-# The csv Date column must have the following format: YYYY-MM-DD
+# The <DTYYYYMMDD> column must have the format YYYYMMDD and the <TIME> column
+# the format HHMMSS, or 0 for daily and weekly bars.
+
+COLUMNS = ["<DTYYYYMMDD>", "<TIME>", "<OPEN>", "<HIGH>", "<LOW>", "<CLOSE>", "<VOL>"]
+FREQUENCIES = [bar.Frequency.SECOND, bar.Frequency.MINUTE, bar.Frequency.HOUR, bar.Frequency.DAY, bar.Frequency.WEEK]
 
 def parse_datetime(date, time):
     # Sample: 20051230 153500
@@ -91,11 +95,128 @@ class RowParser(csvfeed.RowParser):
         return bar.BasicBar(dateTime, open_, high, low, close, volume, None, self.__frequency)
 
 
+class BulkParser(object):
+    """Parses whole Visual Chart files, much faster than :class:`RowParser` on intraday files.
+
+    The column positions are resolved once from the header and every line is split directly.
+    Dates and times are parsed once and cached, since intraday files repeat each date for
+    every bar of the session and each time for every session. With a timezone, the UTC offset
+    is also resolved once per date unless the date has a daylight saving transition.
+
+    :param frequency: The frequency of the bars.
+    :param timezone: The timezone to use to localize bars.
+    :param sanitize: True to sanitize the open, high, low and close prices.
+    :param skipMalformedBars: True to skip the lines that can't be parsed instead of raising.
+    """
+
+    # Lines read and parsed at a time.
+    BATCH_SIZE = 10000
+
+    def __init__(self, frequency, timezone=None, sanitize=False, skipMalformedBars=False):
+        self.__frequency = frequency
+        self.__timezone = timezone
+        self.__sanitize = sanitize
+        self.__skipMalformedBars = skipMalformedBars
+        self.__dates = {}
+        self.__times = {}
+
+    def __getDate(self, dateString):
+        # (date, tzinfo) with the tzinfo of the whole date, or None if it must be resolved per bar.
+        ret = self.__dates.get(dateString)
+        if ret is None:
+            date = datetime.datetime(int(dateString[0:4]), int(dateString[4:6]), int(dateString[6:8]))
+            tzinfo = None
+            if self.__timezone:
+                first = dt.localize(date, self.__timezone)
+                last = dt.localize(date + datetime.timedelta(hours=23, minutes=59, seconds=59), self.__timezone)
+                if first.utcoffset() == last.utcoffset():
+                    tzinfo = first.tzinfo
+            ret = (date, tzinfo)
+            self.__dates[dateString] = ret
+        return ret
+
+    def __getTime(self, timeString):
+        ret = self.__times.get(timeString)
+        if ret is None:
+            padded = timeString.zfill(6)
+            ret = datetime.timedelta(hours=int(padded[0:2]), minutes=int(padded[2:4]), seconds=int(padded[4:6]))
+            self.__times[timeString] = ret
+        return ret
+
+    def getPositions(self, header):
+        """Returns the positions of the :data:`COLUMNS` in a header line."""
+        names = [name.strip() for name in header.split(",")]
+        try:
+            return [names.index(name) for name in COLUMNS]
+        except ValueError:
+            raise Exception("Not a Visual Chart file, the header must have the columns %s" % ",".join(COLUMNS))
+
+    def parseLines(self, lines, positions):
+        """Returns the bars of a batch of data lines."""
+        ret = []
+        dateCol, timeCol, openCol, highCol, lowCol, closeCol, volCol = positions
+        width = max(positions) + 1
+        dates = self.__dates
+        times = self.__times
+        frequency = self.__frequency
+        timezone = self.__timezone
+        sanitize = self.__sanitize
+        BasicBar = bar.BasicBar
+
+        for line in lines:
+            fields = line.rstrip().split(",")
+            try:
+                if len(fields) < width:
+                    if not line.strip():
+                        continue
+                    raise Exception("Missing columns in line: %s" % line.strip())
+
+                date = dates.get(fields[dateCol])
+                if date is None:
+                    date = self.__getDate(fields[dateCol])
+                time = times.get(fields[timeCol])
+                if time is None:
+                    time = self.__getTime(fields[timeCol])
+                dateTime = date[0] + time
+                if timezone:
+                    if date[1] is not None:
+                        dateTime = dateTime.replace(tzinfo=date[1])
+                    else:
+                        dateTime = dt.localize(dateTime, timezone)
+
+                open_ = float(fields[openCol])
+                high = float(fields[highCol])
+                low = float(fields[lowCol])
+                close = float(fields[closeCol])
+                volume = float(fields[volCol])
+                if sanitize:
+                    open_, high, low, close = common.sanitize_ohlc(open_, high, low, close)
+                ret.append(BasicBar(dateTime, open_, high, low, close, volume, None, frequency))
+            except Exception:
+                if not self.__skipMalformedBars:
+                    raise
+        return ret
+
+    def parseFile(self, path):
+        """Returns the bars of a Visual Chart file, in file order."""
+        ret = []
+        with open(path, "r") as fileIn:
+            positions = self.getPositions(fileIn.readline())
+            batch = []
+            for line in fileIn:
+                batch.append(line)
+                if len(batch) == BulkParser.BATCH_SIZE:
+                    ret.extend(self.parseLines(batch, positions))
+                    batch = []
+            ret.extend(self.parseLines(batch, positions))
+        return ret
+
+
 class Feed(csvfeed.BarFeed):
-    """A :class:`pyalgotrade.barfeed.csvfeed.BarFeed` that loads bars from CSV files downloaded from Yahoo! Finance.
+    """A :class:`pyalgotrade.barfeed.csvfeed.BarFeed` that loads bars from CSV files exported from Visual Chart.
 
-    :param frequency: The frequency of the bars. Works down to **pyalgotrade.bar.Frequency.MINUTE**
-        are supported.
+    :param frequency: The frequency of the bars. **pyalgotrade.bar.Frequency.SECOND**, **MINUTE**, **HOUR**,
+        **DAY** and **WEEK** are supported.
     :param timezone: The default timezone to use to localize bars. Check :mod:`pyalgotrade.marketsession`.
     :type timezone: A pytz timezone.
     :param maxLen: The maximum number of values that the :class:`pyalgotrade.dataseries.bards.BarDataSeries` will hold.
@@ -114,7 +235,7 @@ class Feed(csvfeed.BarFeed):
         if isinstance(timezone, int):
             raise Exception("timezone as an int parameter is not supported anymore. Please use a pytz timezone instead.")
 
-        if frequency not in [bar.Frequency.DAY, bar.Frequency.WEEK]:
+        if frequency not in FREQUENCIES:
             raise Exception("Invalid frequency.")
 
         csvfeed.BarFeed.__init__(self, frequency, maxLen)
@@ -127,7 +248,7 @@ class Feed(csvfeed.BarFeed):
     def barsHaveAdjClose(self):
         return False
 
-    def addBarsFromCSV(self, instrument, path, timezone=None):
+    def addBarsFromCSV(self, instrument, path, timezone=None, skipMalformedBars=False):
         """Loads bars for a given instrument from a CSV formatted file.
         The instrument gets registered in the bar feed.
 
@@ -137,6 +258,8 @@ class Feed(csvfeed.BarFeed):
         :type path: string.
         :param timezone: The timezone to use to localize bars. Check :mod:`pyalgotrade.marketsession`.
         :type timezone: A pytz timezone.
+        :param skipMalformedBars: True to skip the lines that can't be parsed.
+        :type skipMalformedBars: boolean.
         """
 
         if isinstance(timezone, int):
@@ -145,5 +268,9 @@ class Feed(csvfeed.BarFeed):
         if timezone is None:
             timezone = self.__timezone
 
-        rowParser = RowParser(self.getDailyBarTime(), self.getFrequency(), timezone, self.__sanitizeBars)
-        csvfeed.BarFeed.addBarsFromCSV(self, instrument, path, rowParser)
+        parser = BulkParser(self.getFrequency(), timezone, self.__sanitizeBars, skipMalformedBars)
+        loadedBars = parser.parseFile(path)
+        barFilter = self.getBarFilter()
+        if barFilter is not None:
+            loadedBars = [bar_ for bar_ in loadedBars if barFilter.includeBar(bar_)]
+        self.addBarsFromSequence(instrument, loadedBars)
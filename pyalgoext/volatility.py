@@ -25,7 +25,67 @@ from collections import deque
 from pyalgotrade import stratanalyzer
 from pyalgotrade import dataseries
 from pyalgotrade.stratanalyzer import returns
-from pyalgotrade.utils import stats
+
+
+class RollingStdDev(object):
+    """Sample standard deviation of the last values, updated in O(1) per value.
+
+    Keeps the mean and the sum of squared deviations (Welford) and swaps the value leaving
+    the window for the new one. They are recomputed from the window every recenter updates,
+    and whenever the sum of squares collapses (e.g. a flat window after a volatile one),
+    so rounding errors do not build up.
+
+    :param window: the number of values to consider.
+    :type window: int.
+    :param recenter: the number of updates between exact recalculations. Defaults to the window.
+    :type recenter: int.
+    """
+
+    def __init__(self, window, recenter=None):
+        assert(window > 1)
+        self.__window = window
+        self.__recenter = recenter or window
+        self.__values = deque()
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.__updates = 0
+
+    def __recalculate(self):
+        count = len(self.__values)
+        self.__mean = math.fsum(self.__values) / count
+        self.__m2 = math.fsum((value - self.__mean) ** 2 for value in self.__values)
+        self.__updates = 0
+
+    def add(self, value):
+        previous = self.__m2
+        self.__values.append(value)
+        if len(self.__values) > self.__window:
+            old = self.__values.popleft()
+            mean = self.__mean + (value - old) / self.__window
+            self.__m2 += (value - old) * (value - mean + old - self.__mean)
+            self.__mean = mean
+        else:
+            delta = value - self.__mean
+            self.__mean += delta / len(self.__values)
+            self.__m2 += delta * (value - self.__mean)
+
+        self.__updates += 1
+        if self.__updates >= self.__recenter or self.__m2 < previous * 1e-6:
+            self.__recalculate()
+
+    def getWindow(self):
+        return self.__window
+
+    def isFull(self):
+        return len(self.__values) == self.__window
+
+    def getValue(self):
+        """The sample standard deviation, or None until there are two values."""
+        count = len(self.__values)
+        if count < 2:
+            return None
+        return math.sqrt(max(self.__m2, 0.0) / (count - 1))
+
 
 class VolaAnalyzer(stratanalyzer.StrategyAnalyzer):
     """A :class:`pyalgotrade.stratanalyzer.StrategyAnalyzer` that calculates
@@ -33,17 +93,27 @@ class VolaAnalyzer(stratanalyzer.StrategyAnalyzer):
 
     :param sessions: the number of historic sessions to consider for each daily volatility ratio.
     :type sessions: int.
+    :param windows: other numbers of sessions (e.g. [20, 60, 252]) to calculate in the same pass.
+    :type windows: list.
     """
 
-    def __init__(self, sessions=126):
+    def __init__(self, sessions=126, windows=None):
         self.__retBuffer = []
         self.__sessions = sessions
-        self.__returns = dataseries.SequenceDataSeries(maxLen=sessions)
-        self.__volaSeries = dataseries.SequenceDataSeries()
+        self.__stdDevs = [RollingStdDev(sessions)]
+        self.__volaSeries = {sessions: dataseries.SequenceDataSeries()}
+        for window in windows or []:
+            if window not in self.__volaSeries:
+                self.__stdDevs.append(RollingStdDev(window))
+                self.__volaSeries[window] = dataseries.SequenceDataSeries()
         self.__currentDate = None
 
-    def getVolaSeries(self):
-        return self.__volaSeries
+    def getVolaSeries(self, sessions=None):
+        """The volatility series of a window, by default the one of the sessions parameter."""
+        return self.__volaSeries[sessions or self.__sessions]
+
+    def getWindows(self):
+        return [stdDev.getWindow() for stdDev in self.__stdDevs]
 
     def beforeAttach(self, strat):
         # Get or create a shared ReturnsAnalyzerBase
@@ -63,6 +133,7 @@ class VolaAnalyzer(stratanalyzer.StrategyAnalyzer):
                     netReturn = (1 + netReturn) * (1 + aReturn) - 1
                 self.__retBuffer = []
             self.__currentDate = dateTime.date()
-            self.__returns.append(netReturn)
-            if len(self.__returns) == self.__sessions:
-                self.__volaSeries.appendWithDateTime(dateTime.date(), stats.stddev(self.__returns, 1) * math.sqrt(252) * 100)
\ No newline at end of file
+            for stdDev in self.__stdDevs:
+                stdDev.add(netReturn)
+                if stdDev.isFull():
+                    self.__volaSeries[stdDev.getWindow()].appendWithDateTime(dateTime.date(), stdDev.getValue() * math.sqrt(252) * 100)
@@ -0,0 +1,44 @@
+"""Tests of the pyq quote cache, run with: python -m unittest test_pyq"""
+
+import anydbm
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyq
+
+
+class QuoteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = pyq.QuoteCache(os.path.join(self.dir, 'stocks.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def test_import_anydbm_keeps_non_numeric_fields_in_place(self):
+        path = os.path.join(self.dir, 'stocks.db')
+        old_db = anydbm.open(path, 'c')
+        old_db[repr(('20120102', 'ABC'))] = repr(['10.5', 'N/A', '9.5', '10', '1200', '10'])
+        old_db[repr(('20120103', 'ABC'))] = repr('NA')
+        old_db[repr(('20120104', 'ABC'))] = repr(2)
+        old_db.close()
+
+        self.assertEqual(pyq.import_anydbm(path, self.cache), 3)
+        self.assertEqual(self.cache.read('ABC', '20120101', '20120131'), {
+            '20120102': (pyq.DATA, ['10.5', pyq.MISSING, '9.5', '10', '1200', '10']),
+            '20120103': (pyq.NA, []),
+            '20120104': (2, []),
+        })
+
+    def test_store_and_read_round_trip(self):
+        datum = ['10.5', pyq.MISSING, '9.5', '10', '1200', '10']
+        self.cache.store('ABC', [('20120102', pyq.DATA, datum)])
+        self.cache.store('ABC', [('20120102', pyq.DATA, self.cache.read('ABC', '20120102', '20120102')['20120102'][1])])
+        self.assertEqual(self.cache.read('ABC', '20120102', '20120102'), {'20120102': (pyq.DATA, datum)})
+
+
+if __name__ == '__main__':
+    unittest.main()